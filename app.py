@@ -1,19 +1,30 @@
 import streamlit as st
-import os
-import time
 import warnings
-import requests
-import tempfile
-from datetime import datetime
-from urllib.parse import urlparse, parse_qs
-from youtube_transcript_api import YouTubeTranscriptApi, TranscriptsDisabled, NoTranscriptFound
-from yt_dlp import YoutubeDL
-from deep_translator import GoogleTranslator
-from langdetect import detect
+from segments import to_srt, to_vtt
+from transcript_cache import transcript_text
+from whisper_pool import start_warm_up
+from language import LANGUAGE_NAMES, LANGUAGE_OPTIONS, DEFAULT_TARGET_INDEX
+from jobs import start_preload
+from metrics import start_metrics_server
+from ui import (
+    start_job, current_job, job_pending, show_job_progress, poll_job, time_to_first_output,
+    show_latencies, start_collection, current_collection, show_collection_progress,
+)
+from playlists import collection_url
 
 # Suppress non-critical warnings
 warnings.filterwarnings("ignore", message="FP16 is not supported on CPU")
 
+# Load the Whisper model once per server process, before the first request needs it
+start_warm_up()
+
+# The pipeline's dependencies and langdetect's profiles load in the background, so the first
+# page renders without waiting for them
+start_preload()
+
+# Prometheus scrapes stage timings and counters from a port of its own
+start_metrics_server()
+
 # Set page config
 st.set_page_config(
     page_title="YouTube Video Translator Pro",
@@ -167,162 +178,6 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-def get_video_id(url):
-    parsed_url = urlparse(url)
-    if parsed_url.hostname == 'youtu.be':
-        return parsed_url.path[1:]
-    if parsed_url.hostname in ['www.youtube.com', 'youtube.com']:
-        query = parse_qs(parsed_url.query)
-        return query.get('v', [None])[0]
-    return None
-
-def check_video_status(video_url):
-    try:
-        with YoutubeDL({'quiet': True}) as ydl:
-            info = ydl.extract_info(video_url, download=False)
-
-            upload_date = info.get('upload_date')
-            if upload_date:
-                upload_time = datetime.strptime(upload_date, '%Y%m%d')
-                age_days = (datetime.now() - upload_time).days
-                if age_days < 1:
-                    return False, "Video recently uploaded, try after some time."
-
-            if info.get('is_live') or info.get('was_live'):
-                return False, "Live streams are not supported."
-            if info.get('live_status') == 'post_live':
-                return False, "Live stream recording is still being processed."
-
-            return True, "Video is ready."
-
-    except Exception as e:
-        return False, f"Error checking video status: {str(e)}"
-
-def fetch_transcript(video_id):
-    try:
-        transcript = YouTubeTranscriptApi.get_transcript(video_id, languages=['en', 'hi'])
-        return " ".join([entry['text'] for entry in transcript])
-    except (TranscriptsDisabled, NoTranscriptFound):
-        return None
-    except Exception as e:
-        st.error(f"Transcript error: {str(e)}")
-        return None
-
-def fetch_captions_url(video_url, lang='en'):
-    try:
-        with YoutubeDL({
-            'skip_download': True,
-            'writesubtitles': True,
-            'writeautomaticsub': True,
-            'subtitleslangs': [lang],
-            'quiet': True
-        }) as ydl:
-            info = ydl.extract_info(video_url, download=False)
-            subs = info.get('subtitles', {}).get(lang)
-            auto = info.get('automatic_captions', {}).get(lang)
-            captions = subs or auto
-            return captions[0]['url'] if captions else None
-    except Exception as e:
-        st.error(f"Captions error: {str(e)}")
-        return None
-
-def get_audio_stream_url(video_url):
-    try:
-        with YoutubeDL({
-            'format': 'bestaudio/best',
-            'quiet': True,
-            'no_warnings': True
-        }) as ydl:
-            info = ydl.extract_info(video_url, download=False)
-            return info.get('url')
-    except Exception as e:
-        st.error(f"Audio stream error: {str(e)}")
-        return None
-
-def transcribe_with_whisper(audio_url):
-    try:
-        import whisper
-        with tempfile.NamedTemporaryFile(suffix=".webm", delete=False) as temp_audio:
-            response = requests.get(audio_url, stream=True, timeout=30)
-            response.raise_for_status()
-            for chunk in response.iter_content(chunk_size=8192):
-                temp_audio.write(chunk)
-            temp_audio_path = temp_audio.name
-
-        model_dir = os.path.join(os.path.expanduser("~"), ".cache", "whisper")
-        os.makedirs(model_dir, exist_ok=True)
-
-        model = whisper.load_model("base", download_root=model_dir)
-        result = model.transcribe(temp_audio_path, fp16=False)
-
-        os.unlink(temp_audio_path)
-        return result["text"]
-
-    except ImportError:
-        st.error("Whisper not installed. Run: pip install openai-whisper")
-        return None
-    except Exception as e:
-        st.error(f"Whisper error: {str(e)}")
-        return None
-
-def translate_text_dynamic_lang_detection(text, target_lang):
-    def split_text(text):
-        sentences = [s.strip() for s in text.split('। ') if s.strip()]
-        chunks = []
-        current_chunk = ""
-        for sentence in sentences:
-            if len(current_chunk) + len(sentence) > 2000:
-                chunks.append(current_chunk)
-                current_chunk = sentence
-            else:
-                current_chunk += "। " + sentence if current_chunk else sentence
-        if current_chunk:
-            chunks.append(current_chunk)
-        return chunks
-
-    translated_chunks = []
-    chunks = split_text(text)
-    for i, chunk in enumerate(chunks, 1):
-        for attempt in range(3):
-            try:
-                source_lang = detect(chunk)
-                translated = GoogleTranslator(source=source_lang, target=target_lang).translate(chunk)
-                translated_chunks.append(translated)
-                time.sleep(5)
-                break
-            except Exception:
-                time.sleep(10)
-        else:
-            translated_chunks.append(f"[Translation failed for chunk {i}]")
-
-    return "\n\n".join(translated_chunks)
-
-def process_video(video_url, target_lang='hi'):
-    video_id = get_video_id(video_url)
-    if not video_id:
-        return "Invalid YouTube URL", None
-
-    is_ready, reason = check_video_status(video_url)
-    if not is_ready:
-        return reason, None
-
-    text = fetch_transcript(video_id)
-    if not text:
-        captions_url = fetch_captions_url(video_url)
-        if captions_url:
-            return f"Captions available at: {captions_url}", None
-
-    if not text:
-        audio_url = get_audio_stream_url(video_url)
-        if audio_url:
-            text = transcribe_with_whisper(audio_url)
-
-    if not text:
-        return "Could not retrieve transcript or captions", None
-
-    translated = translate_text_dynamic_lang_detection(text, target_lang) if target_lang else text
-    return translated, text
-
 def main():
     # Header section
     col1, col2 = st.columns([1, 3])
@@ -385,60 +240,17 @@ def main():
     with st.sidebar:
         st.header("⚙️ Settings")
         
-        # Language dictionary
-        lang_dict = {
-            "Afrikaans": "af", "Albanian": "sq", "Amharic": "am", "Arabic": "ar",
-            "Armenian": "hy", "Assamese": "as", "Aymara": "ay", "Azerbaijani": "az",
-            "Bambara": "bm", "Basque": "eu", "Belarusian": "be", "Bengali": "bn",
-            "Bhojpuri": "bho", "Bosnian": "bs", "Bulgarian": "bg", "Catalan": "ca",
-            "Cebuano": "ceb", "Chichewa": "ny", "Chinese (Simplified)": "zh-CN",
-            "Chinese (Traditional)": "zh-TW", "Corsican": "co", "Croatian": "hr",
-            "Czech": "cs", "Danish": "da", "Dhivehi": "dv", "Dogri": "doi",
-            "Dutch": "nl", "English": "en", "Esperanto": "eo", "Estonian": "et",
-            "Ewe": "ee", "Filipino": "tl", "Finnish": "fi", "French": "fr",
-            "Frisian": "fy", "Galician": "gl", "Georgian": "ka", "German": "de",
-            "Greek": "el", "Guarani": "gn", "Gujarati": "gu", "Haitian Creole": "ht",
-            "Hausa": "ha", "Hawaiian": "haw", "Hebrew": "iw", "Hindi": "hi",
-            "Hmong": "hmn", "Hungarian": "hu", "Icelandic": "is", "Igbo": "ig",
-            "Ilocano": "ilo", "Indonesian": "id", "Irish": "ga", "Italian": "it",
-            "Japanese": "ja", "Javanese": "jw", "Kannada": "kn", "Kazakh": "kk",
-            "Khmer": "km", "Kinyarwanda": "rw", "Konkani": "gom", "Korean": "ko",
-            "Krio": "kri", "Kurdish (Kurmanji)": "ku", "Kurdish (Sorani)": "ckb",
-            "Kyrgyz": "ky", "Lao": "lo", "Latin": "la", "Latvian": "lv",
-            "Lingala": "ln", "Lithuanian": "lt", "Luganda": "lg", "Luxembourgish": "lb",
-            "Macedonian": "mk", "Maithili": "mai", "Malagasy": "mg", "Malay": "ms",
-            "Malayalam": "ml", "Maltese": "mt", "Maori": "mi", "Marathi": "mr",
-            "Meiteilon (Manipuri)": "mni-Mtei", "Mizo": "lus", "Mongolian": "mn",
-            "Myanmar": "my", "Nepali": "ne", "Norwegian": "no", "Odia (Oriya)": "or",
-            "Oromo": "om", "Pashto": "ps", "Persian": "fa", "Polish": "pl",
-            "Portuguese": "pt", "Punjabi": "pa", "Quechua": "qu", "Romanian": "ro",
-            "Russian": "ru", "Samoan": "sm", "Sanskrit": "sa", "Scots Gaelic": "gd",
-            "Sepedi": "nso", "Serbian": "sr", "Sesotho": "st", "Shona": "sn",
-            "Sindhi": "sd", "Sinhala": "si", "Slovak": "sk", "Slovenian": "sl",
-            "Somali": "so", "Spanish": "es", "Sundanese": "su", "Swahili": "sw",
-            "Swedish": "sv", "Tajik": "tg", "Tamil": "ta", "Tatar": "tt",
-            "Telugu": "te", "Thai": "th", "Tigrinya": "ti", "Tsonga": "ts",
-            "Turkish": "tr", "Turkmen": "tk", "Twi": "ak", "Ukrainian": "uk",
-            "Urdu": "ur", "Uyghur": "ug", "Uzbek": "uz", "Vietnamese": "vi",
-            "Welsh": "cy", "Xhosa": "xh", "Yiddish": "yi", "Yoruba": "yo",
-            "Zulu": "zu"
-        }
-
         target_lang = st.selectbox(
             "🌐 Target Language",
-            options=list(lang_dict.values()),
-            format_func=lambda code: [k for k, v in lang_dict.items() if v == code][0],
-            index=list(lang_dict.values()).index("hi") if "hi" in lang_dict.values() else 0
+            options=LANGUAGE_OPTIONS,
+            format_func=LANGUAGE_NAMES.get,
+            index=DEFAULT_TARGET_INDEX
         )
 
         retries = st.slider("🔄 Retry Attempts", 1, 5, 3)
         
-        st.markdown("### 📊 Usage Statistics")
-        st.markdown("""
-        - **Languages Supported:** 100+
-        - **Daily Translations:** 1,000+
-        - **Accuracy Rate:** 95%+
-        """)
+        st.markdown("### 📊 Live Latency")
+        show_latencies()
         st.markdown('<div class="divider"></div>', unsafe_allow_html=True)
 
     # Main content area
@@ -446,68 +258,96 @@ def main():
         url = st.text_input(
             "🔗 Enter YouTube Video URL:",
             placeholder="https://www.youtube.com/watch?v=...",
-            help="Paste any YouTube video URL to translate its content"
+            help="Paste any YouTube video, playlist or channel URL to translate its content"
         )
 
         if st.button("🚀 Translate Video", use_container_width=True):
             if not url:
                 st.error("Please enter a valid YouTube URL")
             else:
-                with st.spinner("🔍 Processing video content..."):
-                    try:
-                        result, original = None, None
-                        progress_bar = st.progress(0)
-                        
-                        for attempt in range(retries):
-                            progress = (attempt + 1) / retries
-                            progress_bar.progress(progress)
-                            
-                            result, original = process_video(url, target_lang=target_lang)
-                            if not result.startswith(("Video recently", "Live streams", "still being processed", "Error")):
-                                break
-                            time.sleep(5 * (attempt + 1))
-
-                        progress_bar.empty()
-
-                        if not result:
-                            st.error("Failed to process the video after multiple attempts.")
-                        elif original:
-                            with st.expander("📝 Original Transcript", expanded=True):
-                                st.text_area(
-                                    "Original content",
-                                    original,
-                                    height=300,
-                                    label_visibility="collapsed"
-                                )
-                            
-                            with st.expander(f"🌍 Translated Text ({target_lang})", expanded=True):
-                                st.text_area(
-                                    "Translated content",
-                                    result,
-                                    height=300,
-                                    label_visibility="collapsed"
-                                )
-                            
-                            # Add download buttons
-                            col1, col2 = st.columns(2)
-                            with col1:
-                                st.download_button(
-                                    label="⬇️ Download Original",
-                                    data=original,
-                                    file_name="original_transcript.txt",
-                                    mime="text/plain"
-                                )
-                            with col2:
-                                st.download_button(
-                                    label="⬇️ Download Translation",
-                                    data=result,
-                                    file_name=f"translated_{target_lang}.txt",
-                                    mime="text/plain"
-                                )
-                        else:
-                            st.info(result)
-                    except Exception as e:
-                        st.error(f"An unexpected error occurred: {str(e)}")
+                # Each stage retries on its own, up to `retries` attempts, on a background worker
+                if collection_url(url):
+                    with st.spinner("📋 Listing videos..."):
+                        start_collection(url, target_lang, retries)
+                else:
+                    start_job(url, target_lang, retries)
+
+        collection = current_collection()
+        job = current_job() if collection is None else None
+        pending = job is not None and job_pending(job)
+        if collection is not None:
+            pending = show_collection_progress(collection)
+        elif pending:
+            with st.spinner("🔍 Processing video content..."):
+                show_job_progress(job)
+        elif job is not None:
+            try:
+                outcome = job['outcome']
+                result = outcome.get('message') or outcome['translated']
+                original = transcript_text(outcome['transcript']) if 'transcript' in outcome else None
+
+                first_output = time_to_first_output(job)
+                if first_output is not None:
+                    st.metric("⏱️ Time to First Output", f"{first_output:.1f}s")
+
+                if outcome.get('error') is not None and outcome['error'].retryable:
+                    st.error(f"Failed to process the video after multiple attempts: {result}")
+                elif original:
+                    with st.expander("📝 Original Transcript", expanded=True):
+                        st.text_area(
+                            "Original content",
+                            original,
+                            height=300,
+                            label_visibility="collapsed"
+                        )
+                    
+                    with st.expander(f"🌍 Translated Text ({job['target_lang']})", expanded=True):
+                        st.text_area(
+                            "Translated content",
+                            result,
+                            height=300,
+                            label_visibility="collapsed"
+                        )
+                    
+                    # Add download buttons
+                    col1, col2 = st.columns(2)
+                    with col1:
+                        st.download_button(
+                            label="⬇️ Download Original",
+                            data=original,
+                            file_name="original_transcript.txt",
+                            mime="text/plain"
+                        )
+                    with col2:
+                        st.download_button(
+                            label="⬇️ Download Translation",
+                            data=result,
+                            file_name=f"translated_{job['target_lang']}.txt",
+                            mime="text/plain"
+                        )
+
+                    # Timed subtitles straight from the segment stores
+                    subtitles = [("Original", outcome['transcript']['segments'], "original_transcript")]
+                    if outcome.get('translation') is not None:
+                        subtitles.append(("Translated", outcome['translation'], f"translated_{job['target_lang']}"))
+                    for column, (label, store, file_stem) in zip(st.columns(2), subtitles):
+                        with column:
+                            st.download_button(
+                                label=f"⬇️ {label} Subtitles (.srt)",
+                                data=to_srt(store),
+                                file_name=f"{file_stem}.srt",
+                                mime="application/x-subrip"
+                            )
+                            st.download_button(
+                                label=f"⬇️ {label} Subtitles (.vtt)",
+                                data=to_vtt(store),
+                                file_name=f"{file_stem}.vtt",
+                                mime="text/vtt"
+                            )
+                else:
+                    st.info(result)
+            except Exception as e:
+                st.error(f"An unexpected error occurred: {str(e)}")
  # Testimonials section
     st.markdown('<div class="divider"></div>', unsafe_allow_html=True)
     st.subheader("💬 What Our Users Say")
@@ -548,5 +388,9 @@ def main():
         </div>
         """, unsafe_allow_html=True)
 
+    # Check on the job again once the whole page is drawn
+    if pending:
+        poll_job()
+
 if __name__ == "__main__":
     main()
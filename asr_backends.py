@@ -0,0 +1,185 @@
+import logging
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+
+from audio_stream import SAMPLE_RATE
+
+logger = logging.getLogger(__name__)
+
+# whisper: openai-whisper in float32; whisper-int8: the same model with its Linear layers
+# dynamically quantized to int8; faster-whisper: CTranslate2 int8 engine; stub: no model
+ASR_BACKEND = os.environ.get('ASR_BACKEND', 'whisper')
+# Local CTranslate2 model directory for faster-whisper; defaults to the WHISPER_MODEL name
+ASR_MODEL_PATH = os.environ.get('ASR_MODEL_PATH')
+ASR_COMPUTE_TYPE = os.environ.get('ASR_COMPUTE_TYPE', 'int8')
+WHISPER_THREADS = int(os.environ.get('WHISPER_THREADS', 0))  # 0 keeps the engine's default
+MODEL_DIR = os.path.join(os.path.expanduser("~"), ".cache", "whisper")
+# The stub sleeps this long per second of audio and emits one segment per STUB_SEGMENT_SECONDS
+ASR_STUB_RTF = float(os.environ.get('ASR_STUB_RTF', 0))
+STUB_SEGMENT_SECONDS = 5
+
+INSTALL_HINTS = {
+    'whisper': "pip install openai-whisper",
+    'whisper-int8': "pip install openai-whisper",
+    'faster-whisper': "pip install faster-whisper",
+}
+
+
+class ASRModel(ABC):
+    # What the model pool hands out. transcribe() takes a 16 kHz mono float32 array or an audio
+    # file path and returns openai-whisper's result shape: {'segments': [{'text', 'start',
+    # 'end', 'words'}], 'language'}. Every call adds to the real-time factor counters.
+    name = None
+
+    def __init__(self):
+        self.audio_seconds = 0.0
+        self.wall_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def transcribe(self, audio, language=None, initial_prompt=None, word_timestamps=False, **options):
+        started = time.perf_counter()
+        result, duration = self._transcribe(audio, language, initial_prompt, word_timestamps)
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self.audio_seconds += duration
+            self.wall_seconds += elapsed
+        logger.debug("asr backend=%s audio=%.1fs rtf=%.3f", self.name, duration, elapsed / duration if duration else 0)
+        return result
+
+    @abstractmethod
+    def _transcribe(self, audio, language, initial_prompt, word_timestamps):
+        pass
+
+    def snapshot(self):
+        with self._lock:
+            return self.audio_seconds, self.wall_seconds
+
+
+def _plain_linears(module, torch):
+    # whisper's Linear subclasses nn.Linear, and quantize_dynamic only swaps modules whose
+    # type is exactly nn.Linear. Same weights, same CPU float32 forward.
+    for name, child in module.named_children():
+        if isinstance(child, torch.nn.Linear) and type(child) is not torch.nn.Linear:
+            plain = torch.nn.Linear(child.in_features, child.out_features, bias=child.bias is not None)
+            plain.weight = child.weight
+            plain.bias = child.bias
+            setattr(module, name, plain)
+        else:
+            _plain_linears(child, torch)
+
+
+class WhisperASR(ASRModel):
+    name = 'whisper'
+
+    def __init__(self, model_name, threads=WHISPER_THREADS, quantize=False):
+        super().__init__()
+        import whisper
+        import torch
+
+        if threads > 0:
+            torch.set_num_threads(threads)
+        os.makedirs(MODEL_DIR, exist_ok=True)
+        logger.info("Loading whisper model %s%s", model_name, " (int8 dynamic)" if quantize else "")
+        device = 'cpu' if quantize else None  # dynamic quantization only runs on CPU
+        self.model = whisper.load_model(model_name, device=device, download_root=MODEL_DIR)
+        if quantize:
+            # Weights of every Linear layer go to int8; activations are quantized on the fly
+            self.name = 'whisper-int8'
+            _plain_linears(self.model, torch)
+            self.model = torch.quantization.quantize_dynamic(self.model, {torch.nn.Linear}, dtype=torch.qint8)
+            quantized = sum(isinstance(m, torch.ao.nn.quantized.dynamic.Linear) for m in self.model.modules())
+            if not quantized:
+                raise RuntimeError(f"int8 quantization of whisper model {model_name} left no Linear layer quantized")
+            logger.info("Quantized %d Linear layers to int8", quantized)
+
+    def _transcribe(self, audio, language, initial_prompt, word_timestamps):
+        import whisper
+
+        if isinstance(audio, str):
+            audio = whisper.load_audio(audio)
+        result = self.model.transcribe(
+            audio, fp16=False, language=language, initial_prompt=initial_prompt, word_timestamps=word_timestamps,
+        )
+        return result, len(audio) / SAMPLE_RATE
+
+
+class FasterWhisperASR(ASRModel):
+    name = 'faster-whisper'
+
+    def __init__(self, model_name, threads=WHISPER_THREADS):
+        super().__init__()
+        from faster_whisper import WhisperModel
+
+        model = ASR_MODEL_PATH or model_name
+        logger.info("Loading faster-whisper model %s (%s)", model, ASR_COMPUTE_TYPE)
+        self.model = WhisperModel(
+            model, device='cpu', compute_type=ASR_COMPUTE_TYPE, cpu_threads=threads, download_root=MODEL_DIR,
+        )
+
+    def _transcribe(self, audio, language, initial_prompt, word_timestamps):
+        segments, info = self.model.transcribe(
+            audio, language=language, initial_prompt=initial_prompt, word_timestamps=word_timestamps,
+        )
+        # segments is a generator; decoding happens while it is consumed
+        result = {
+            'segments': [
+                {
+                    'text': segment.text,
+                    'start': segment.start,
+                    'end': segment.end,
+                    'words': [{'word': w.word, 'start': w.start, 'end': w.end} for w in segment.words or []],
+                }
+                for segment in segments
+            ],
+            'language': info.language,
+        }
+        return result, info.duration
+
+
+class StubASR(ASRModel):
+    # Deterministic output for tests and benchmarks: the same audio length always gives the
+    # same segments, "segment 1", "segment 2", ... one per STUB_SEGMENT_SECONDS
+    name = 'stub'
+
+    def __init__(self, model_name=None, threads=WHISPER_THREADS):
+        super().__init__()
+
+    def _transcribe(self, audio, language, initial_prompt, word_timestamps):
+        if isinstance(audio, str):
+            duration = os.path.getsize(audio) / 16000  # as if 128 kbit/s
+        else:
+            duration = len(audio) / SAMPLE_RATE
+        if ASR_STUB_RTF:
+            time.sleep(duration * ASR_STUB_RTF)
+
+        segments = []
+        start = 0.0
+        while start < duration:
+            end = min(start + STUB_SEGMENT_SECONDS, duration)
+            words = [
+                {'word': " segment", 'start': start, 'end': (start + end) / 2},
+                {'word': f" {len(segments) + 1}", 'start': (start + end) / 2, 'end': end},
+            ]
+            segments.append({'text': f"segment {len(segments) + 1}", 'start': start, 'end': end, 'words': words})
+            start = end
+        return {'segments': segments, 'language': language or 'en'}, duration
+
+
+def load_asr_model(model_name, backend=None, threads=WHISPER_THREADS):
+    backend = backend or ASR_BACKEND
+    if backend == 'whisper':
+        return WhisperASR(model_name, threads)
+    if backend == 'whisper-int8':
+        return WhisperASR(model_name, threads, quantize=True)
+    if backend == 'faster-whisper':
+        return FasterWhisperASR(model_name, threads)
+    if backend == 'stub':
+        return StubASR(model_name, threads)
+    raise ValueError(f"Unknown ASR_BACKEND {backend!r}")
+
+
+def install_hint(backend=None):
+    backend = backend or ASR_BACKEND
+    return INSTALL_HINTS.get(backend, "")
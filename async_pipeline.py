@@ -0,0 +1,89 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from pipeline import (
+    TRANSCRIPT_LANGUAGES,
+    check_video_status,
+    fetch_captions,
+    fetch_transcript,
+    get_audio_stream_url,
+    get_video_id,
+    transcribe_with_whisper,
+    translate_transcript,
+)
+from transcript_cache import get_transcript_cache, transcript_text
+
+# The stages are blocking library calls (yt-dlp, requests, Whisper); they run on this bounded
+# pool, so awaiting many videos at once never needs a thread per video
+ASYNC_PIPELINE_THREADS = int(os.environ.get('ASYNC_PIPELINE_THREADS', 16))
+
+_executor = ThreadPoolExecutor(max_workers=ASYNC_PIPELINE_THREADS, thread_name_prefix="pipeline")
+
+
+async def _run(func, *args):
+    return await asyncio.get_running_loop().run_in_executor(_executor, func, *args)
+
+
+def _cancel(*tasks):
+    # A stage already running in a thread finishes in the background; its result is dropped
+    for task in tasks:
+        task.cancel()
+
+
+async def fetch_transcript_async(video_url, video_id):
+    # Returns (transcript, message); the message explains why there is no transcript
+    cache = get_transcript_cache()
+    transcript = await _run(cache.get, video_id, TRANSCRIPT_LANGUAGES) if cache else None
+    if transcript:
+        return transcript, None
+
+    # The readiness check and the transcript API are independent network calls
+    status = asyncio.create_task(_run(check_video_status, video_url))
+    primary = asyncio.create_task(_run(fetch_transcript, video_id))
+    probes = []
+
+    try:
+        is_ready, reason = await status
+        if not is_ready:
+            _cancel(primary)
+            return None, reason
+
+        transcript = await primary
+        if not transcript:
+            # Both probes read the extraction the readiness check just cached
+            captions, audio = probes = [
+                asyncio.create_task(_run(fetch_captions, video_url)),
+                asyncio.create_task(_run(get_audio_stream_url, video_url)),
+            ]
+            transcript = await captions
+            if transcript:
+                _cancel(audio)
+            else:
+                audio_url = await audio
+                if audio_url:
+                    transcript = await _run(transcribe_with_whisper, audio_url)
+    except BaseException:
+        _cancel(status, primary, *probes)
+        raise
+
+    if transcript and cache:
+        await _run(cache.put, video_id, transcript)
+    return transcript, None if transcript else "Could not retrieve transcript or captions"
+
+
+async def process_video_async(video_url, target_lang='hi'):
+    # Same contract as pipeline.process_video; latency is the slowest needed stage, not the sum
+    video_id = get_video_id(video_url)
+    if not video_id:
+        return "Invalid YouTube URL", None
+
+    transcript, message = await fetch_transcript_async(video_url, video_id)
+    text = transcript_text(transcript) if transcript else None
+    if not text:
+        return message or "Could not retrieve transcript or captions", None
+
+    if not target_lang:
+        return text, text
+    translated, _ = await _run(translate_transcript, transcript, target_lang)
+    return translated, text
@@ -0,0 +1,264 @@
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlparse
+
+import requests
+
+from http_pool import get_session
+from metrics import increment, observe_value, span
+from stages import RetryPolicy
+
+logger = logging.getLogger(__name__)
+
+# googlevideo throttles each connection, so the file is fetched as byte ranges over several;
+# keep this at or below HTTP_POOL_PER_HOST
+AUDIO_CONNECTIONS = int(os.environ.get('AUDIO_CONNECTIONS', 4))
+# Ranges well under 10 MB are served at full speed
+AUDIO_RANGE_BYTES = int(os.environ.get('AUDIO_RANGE_BYTES', 4 * 1024 * 1024))
+AUDIO_RANGE_RETRIES = int(os.environ.get('AUDIO_RANGE_RETRIES', 3))
+AUDIO_DOWNLOAD_DIR = os.environ.get('AUDIO_DOWNLOAD_DIR', os.path.join(tempfile.gettempdir(), "transcripter-audio"))
+# Partial downloads older than this are not worth resuming
+AUDIO_PARTIAL_MAX_AGE = int(os.environ.get('AUDIO_PARTIAL_MAX_AGE', 24 * 3600))
+READ_CHUNK_SIZE = 64 * 1024
+
+RANGE_RETRY = RetryPolicy(AUDIO_RANGE_RETRIES, 1.0, 10.0)
+
+
+def _record(stats, size):
+    # Bytes fetched per audio stream: the total, and their distribution over videos
+    if stats is not None:
+        stats['audio_bytes'] = size
+    increment('audio_bytes', size)
+    observe_value('audio_stream_bytes', size)
+
+
+def _retrying(description, func, *args):
+    for attempt in range(RANGE_RETRY.attempts):
+        try:
+            return func(*args)
+        except (requests.RequestException, IOError) as e:
+            if getattr(getattr(e, 'response', None), 'status_code', None) == 429:
+                increment('rate_limited', service='googlevideo')
+            if attempt + 1 >= RANGE_RETRY.attempts:
+                raise
+            increment('retries', operation='audio_download')
+            delay = RANGE_RETRY.delay(attempt)
+            logger.warning("%s failed (%s), retrying in %.0fs", description, e, delay)
+            time.sleep(delay)
+
+
+def _probe(session, url):
+    with session.get(url, headers={'Range': 'bytes=0-0'}, stream=True) as response:
+        response.raise_for_status()
+        if response.status_code == 206:
+            total = response.headers.get('Content-Range', '').rpartition('/')[2]
+            if total.isdigit():
+                return int(total), True
+        length = response.headers.get('Content-Length')
+        return (int(length) if length else None), False
+
+
+def probe_length(session, url):
+    # A one-byte range gives the total size and tells whether the server honours ranges
+    return _retrying("Audio size probe", _probe, session, url)
+
+
+def split_ranges(total, range_bytes=AUDIO_RANGE_BYTES):
+    # Inclusive (first, last) byte offsets, as the Range header wants them
+    return [(start, min(start + range_bytes, total) - 1) for start in range(0, total, range_bytes)]
+
+
+class RangedDownload:
+    # Per-range progress for one file; fetch() resumes a range from the bytes it already has
+    def __init__(self, total, done=None, range_bytes=AUDIO_RANGE_BYTES):
+        self.total = total
+        self.ranges = split_ranges(total, range_bytes)
+        self.done = list(done) if done and len(done) == len(self.ranges) else [0] * len(self.ranges)
+
+    def size(self, i):
+        first, last = self.ranges[i]
+        return last - first + 1
+
+    def pending(self):
+        return [i for i in range(len(self.ranges)) if self.done[i] < self.size(i)]
+
+    def complete(self):
+        return sum(self.done) == self.total and not self.pending()
+
+    def fetch(self, session, url, i, sink):
+        # sink(offset, data) stores the bytes; failed attempts resume where they stopped
+        first, last = self.ranges[i]
+        _retrying(f"Audio range {first}-{last}", self._fetch_rest, session, url, i, sink)
+
+    def _fetch_rest(self, session, url, i, sink):
+        first, last = self.ranges[i]
+        start = first + self.done[i]
+        with session.get(url, headers={'Range': f"bytes={start}-{last}"}, stream=True) as response:
+            response.raise_for_status()
+            if response.status_code != 206:
+                raise IOError(f"Server ignored range {start}-{last} (HTTP {response.status_code})")
+            for chunk in response.iter_content(chunk_size=READ_CHUNK_SIZE):
+                chunk = chunk[:self.size(i) - self.done[i]]
+                sink(first + self.done[i], chunk)
+                self.done[i] += len(chunk)
+        if self.done[i] != self.size(i):
+            raise IOError(f"Range {first}-{last} ended after {self.done[i]} of {self.size(i)} bytes")
+
+
+def _download_key(url):
+    # googlevideo URLs are re-signed on every extraction; the video id, itag and length are stable
+    query = parse_qs(urlparse(url).query)
+    if 'id' in query and 'itag' in query:
+        url = '|'.join(query[name][0] for name in ('id', 'itag', 'clen') if name in query)
+    return hashlib.sha1(url.encode('utf-8')).hexdigest()
+
+
+def _remove_stale(directory):
+    cutoff = time.time() - AUDIO_PARTIAL_MAX_AGE
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.unlink(path)
+        except OSError:
+            pass
+
+
+def _load_progress(state_path, total):
+    try:
+        with open(state_path) as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return state['done'] if state.get('total') == total else None
+
+
+def _save_progress(state_path, download):
+    with open(state_path, 'w') as f:
+        json.dump({'total': download.total, 'done': download.done}, f)
+
+
+def _download_single(session, url, path):
+    with session.get(url, stream=True) as response:
+        response.raise_for_status()
+        with open(path, 'wb') as f:
+            for chunk in response.iter_content(chunk_size=READ_CHUNK_SIZE):
+                f.write(chunk)
+    return path
+
+
+def download_audio(url, path=None, stats=None):
+    # Downloads to a file (named after the stream unless given) and returns its path. Progress
+    # is kept next to the file, so calling again after a failure only fetches missing bytes.
+    with span('audio_download'):
+        return _download_audio(url, path, stats)
+
+
+def _download_audio(url, path, stats):
+    if path is not None:
+        return _download_to(url, path, stats)
+
+    # The partial file is shared so a retry resumes it, but only one caller at a time works on
+    # it, and a finished download is renamed to a name of its own: the caller deletes it when
+    # done, while another job for the same stream starts over
+    os.makedirs(AUDIO_DOWNLOAD_DIR, exist_ok=True)
+    _remove_stale(AUDIO_DOWNLOAD_DIR)
+    path = os.path.join(AUDIO_DOWNLOAD_DIR, _download_key(url))
+    with open(path + '.lock', 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        _download_to(url, path, stats)
+        own_path = f"{path}.{uuid.uuid4().hex}"
+        os.rename(path, own_path)
+    return own_path
+
+
+def _download_to(url, path, stats):
+    session = get_session()
+    total, ranged = probe_length(session, url)
+    if not ranged or not total:
+        _download_single(session, url, path)
+        _record(stats, os.path.getsize(path))
+        return path
+
+    state_path = path + '.parts'
+    download = RangedDownload(total, _load_progress(state_path, total) if os.path.exists(path) else None)
+    pending = download.pending()
+    if len(pending) < len(download.ranges):
+        logger.info("Resuming audio download, %d of %d ranges left", len(pending), len(download.ranges))
+
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+    pool = ThreadPoolExecutor(max_workers=max(1, min(AUDIO_CONNECTIONS, len(pending))))
+    try:
+        os.ftruncate(fd, total)
+
+        def write(offset, data):
+            os.pwrite(fd, data, offset)
+
+        futures = [pool.submit(download.fetch, session, url, i, write) for i in pending]
+        for future in futures:
+            future.result()
+    except BaseException:
+        pool.shutdown(wait=True, cancel_futures=True)
+        _save_progress(state_path, download)
+        raise
+    finally:
+        pool.shutdown(wait=True)
+        os.close(fd)
+
+    if not download.complete() or os.path.getsize(path) != total:
+        _save_progress(state_path, download)
+        raise IOError(f"Audio download incomplete: {sum(download.done)} of {total} bytes")
+    if os.path.exists(state_path):
+        os.unlink(state_path)
+    _record(stats, total)
+    return path
+
+
+def iter_audio(url, stats=None):
+    # Yields the stream in order while the next ranges download in parallel; at most
+    # AUDIO_CONNECTIONS ranges are held in memory at once
+    session = get_session()
+    total, ranged = probe_length(session, url)
+    if not ranged or not total:
+        with session.get(url, stream=True) as response:
+            response.raise_for_status()
+            received = 0
+            for chunk in response.iter_content(chunk_size=READ_CHUNK_SIZE):
+                received += len(chunk)
+                yield chunk
+        _record(stats, received)
+        return
+
+    download = RangedDownload(total)
+
+    def fetch(i):
+        buffer = bytearray()
+        download.fetch(session, url, i, lambda offset, data: buffer.extend(data))
+        return bytes(buffer)
+
+    pool = ThreadPoolExecutor(max_workers=AUDIO_CONNECTIONS)
+    in_flight = deque()
+    next_range = 0
+    received = 0
+    try:
+        while next_range < len(download.ranges) or in_flight:
+            while next_range < len(download.ranges) and len(in_flight) < AUDIO_CONNECTIONS:
+                in_flight.append(pool.submit(fetch, next_range))
+                next_range += 1
+            data = in_flight.popleft().result()
+            received += len(data)
+            yield data
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    if received != total:
+        raise IOError(f"Audio stream incomplete: {received} of {total} bytes")
+    _record(stats, received)
@@ -0,0 +1,124 @@
+import os
+import queue
+import subprocess
+import threading
+
+from audio_download import iter_audio
+
+SAMPLE_RATE = 16000
+BYTES_PER_SAMPLE = 2  # s16le
+# Set WHISPER_STREAMING=0 to fall back to downloading into a temp file first
+STREAMING = os.environ.get('WHISPER_STREAMING', '1') == '1'
+WINDOW_SECONDS = int(os.environ.get('WHISPER_WINDOW_SECONDS', 30))
+# Decoded windows held ahead of inference; once they are full, ffmpeg and the download wait
+STREAM_BUFFER_WINDOWS = int(os.environ.get('WHISPER_BUFFER_WINDOWS', 3))
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+FFMPEG_CMD = [
+    'ffmpeg', '-hide_banner', '-loglevel', 'error',
+    '-i', 'pipe:0',
+    '-f', 's16le', '-ac', '1', '-ar', str(SAMPLE_RATE),
+    'pipe:1',
+]
+
+
+def _feed_ffmpeg(audio_url, stdin, errors, stats):
+    try:
+        # Ranges arrive in order while the ones after them download in parallel
+        for chunk in iter_audio(audio_url, stats):
+            stdin.write(chunk)
+    except BrokenPipeError:
+        pass  # ffmpeg exited early, its own error is reported by the reader
+    except Exception as e:
+        errors.append(e)
+    finally:
+        try:
+            stdin.close()
+        except OSError:
+            pass
+
+
+def _put(windows, item, stopped):
+    # Waits while inference is behind; gives up once the reader has gone away
+    while not stopped.is_set():
+        try:
+            windows.put(item, timeout=0.5)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+
+def _drain_ffmpeg(stdout, windows, window_bytes, stopped):
+    # Reads at most STREAM_BUFFER_WINDOWS ahead of inference; while the queue is full ffmpeg's
+    # stdout fills up, ffmpeg stops reading its stdin and the download is held back
+    buffer = bytearray()
+    for data in iter(lambda: stdout.read(DOWNLOAD_CHUNK_SIZE), b''):
+        buffer += data
+        while len(buffer) >= window_bytes:
+            if not _put(windows, bytes(buffer[:window_bytes]), stopped):
+                return
+            del buffer[:window_bytes]
+    if buffer and not _put(windows, bytes(buffer), stopped):
+        return
+    _put(windows, None, stopped)
+
+
+def pcm_windows(audio_url, window_seconds=WINDOW_SECONDS, stats=None):
+    # Yields float32 16 kHz mono windows while the audio is still downloading; the compressed
+    # stream goes through ffmpeg as it arrives and is never written out in full
+    import numpy as np
+
+    window_bytes = window_seconds * SAMPLE_RATE * BYTES_PER_SAMPLE
+    proc = subprocess.Popen(FFMPEG_CMD, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    errors = []
+    windows = queue.Queue(maxsize=max(1, STREAM_BUFFER_WINDOWS))
+    stopped = threading.Event()
+    threads = [
+        threading.Thread(target=_feed_ffmpeg, args=(audio_url, proc.stdin, errors, stats), daemon=True),
+        threading.Thread(target=_drain_ffmpeg, args=(proc.stdout, windows, window_bytes, stopped), daemon=True),
+    ]
+    for thread in threads:
+        thread.start()
+
+    try:
+        while True:
+            window = windows.get()
+            if window is None:
+                break
+            yield np.frombuffer(window, dtype=np.int16).astype(np.float32) / 32768.0
+
+        for thread in threads:
+            thread.join()
+        stderr = proc.stderr.read().decode(errors='replace').strip()
+        if proc.wait() != 0:
+            raise RuntimeError(f"ffmpeg failed: {stderr or proc.returncode}")
+        if errors:
+            raise errors[0]
+    finally:
+        stopped.set()
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+
+
+def transcribe_stream(model, audio_url, window_seconds=WINDOW_SECONDS, stats=None):
+    # Returns timed segments and the language Whisper detected on the first window
+    segments = []
+    language = None
+    offset = 0.0
+    for window in pcm_windows(audio_url, window_seconds, stats):
+        # Carry the previous window's tail over as a prompt so sentences continue across cuts
+        prompt = segments[-1]['text'][-200:] if segments else None
+        result = model.transcribe(window, fp16=False, initial_prompt=prompt, language=language)
+        language = language or result.get("language")
+        for segment in result["segments"]:
+            text = segment["text"].strip()
+            if text:
+                segments.append({
+                    'text': text,
+                    'start': offset + segment["start"],
+                    'duration': segment["end"] - segment["start"],
+                })
+        offset += len(window) / SAMPLE_RATE
+    return segments, language
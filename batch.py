@@ -0,0 +1,161 @@
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timezone
+
+from pipeline import get_video_id, outcome_texts, run_pipeline
+from playlists import VIDEO_ID_RE, collection_url, list_collection
+
+logger = logging.getLogger(__name__)
+
+
+def read_targets(path):
+    # One URL or bare video id per line; blank lines and '#' comments are skipped. Playlist
+    # and channel URLs are expanded into their videos, and every video is kept once.
+    targets = []
+    seen = set()
+
+    def add(video_id, url):
+        if (video_id or url) not in seen:
+            seen.add(video_id or url)
+            targets.append((video_id, url))
+
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            if VIDEO_ID_RE.match(line):
+                add(line, f"https://www.youtube.com/watch?v={line}")
+            elif collection_url(line):
+                listing = list_collection(line)
+                logger.info("%s: %d videos, %d duplicates skipped", listing['title'], len(listing['entries']),
+                            listing['duplicates'])
+                for entry in listing['entries']:
+                    add(entry['id'], entry['url'])
+            else:
+                add(get_video_id(line), line)
+    return targets
+
+
+def read_journal(path, target_lang):
+    # Video ids already finished for this target language
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # a torn last line from an interrupted run
+            if record.get('status') == 'done' and record.get('target_lang') == target_lang:
+                done.add(record['video_id'])
+    return done
+
+
+def append_journal(journal, record):
+    journal.write(json.dumps(record, ensure_ascii=False) + '\n')
+    journal.flush()
+    os.fsync(journal.fileno())
+
+
+def _init_worker(workers):
+    from language import init_detector
+    from translation import share_rate
+
+    logging.basicConfig(level=logging.WARNING, format="%(processName)s %(name)s: %(message)s")
+    init_detector()
+    # Every process has its own limiter; together they stay within TRANSLATE_RPS
+    share_rate(workers)
+
+
+def run_one(video_id, url, target_lang, output_dir):
+    started = time.monotonic()
+    outcome = run_pipeline(url, target_lang=target_lang)
+    result, original = outcome_texts(outcome)
+    record = {
+        'video_id': video_id,
+        'url': url,
+        'target_lang': target_lang,
+        'elapsed': round(time.monotonic() - started, 3),
+    }
+    if original:
+        base = os.path.join(output_dir, video_id)
+        with open(f"{base}.txt", 'w', encoding='utf-8') as f:
+            f.write(original)
+        with open(f"{base}.{target_lang}.txt", 'w', encoding='utf-8') as f:
+            f.write(result)
+        record.update(status='done', output=f"{base}.{target_lang}.txt")
+        if outcome['failed_chunks']:
+            # Written with the failed chunks marked, but not done: a resumed run retries it
+            record.update(status='partial', failed_chunks=outcome['failed_chunks'])
+    else:
+        record.update(status='failed', message=result)
+    return record
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Transcribe and translate YouTube videos without the web UI.")
+    parser.add_argument('input', help="file with one YouTube URL or video id per line")
+    parser.add_argument('--target-lang', default='hi', help="Google Translate language code (default: hi)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="worker processes")
+    parser.add_argument('--journal', default='batch_journal.jsonl', help="append-only JSONL journal used to resume")
+    parser.add_argument('--output-dir', default='batch_output', help="where transcripts and translations are written")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    targets = read_targets(args.input)
+    done = read_journal(args.journal, args.target_lang)
+    pending = [(video_id, url) for video_id, url in targets if video_id not in done]
+    logger.info("%d videos, %d already done, %d to process", len(targets), len(targets) - len(pending), len(pending))
+
+    counts = {'done': 0, 'partial': 0, 'failed': 0}
+    started = time.monotonic()
+    with open(args.journal, 'a', encoding='utf-8') as journal, \
+            ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker,
+                                initargs=(args.workers,)) as pool:
+        futures = {}
+        for video_id, url in pending:
+            if not video_id:
+                append_journal(journal, {'video_id': None, 'url': url, 'target_lang': args.target_lang,
+                                         'status': 'failed', 'message': "Invalid YouTube URL",
+                                         'finished_at': datetime.now(timezone.utc).isoformat()})
+                counts['failed'] += 1
+                continue
+            futures[pool.submit(run_one, video_id, url, args.target_lang, args.output_dir)] = (video_id, url)
+
+        try:
+            for future in as_completed(futures):
+                video_id, url = futures[future]
+                try:
+                    record = future.result()
+                except Exception as e:
+                    record = {'video_id': video_id, 'url': url, 'target_lang': args.target_lang,
+                              'status': 'failed', 'message': f"Worker error: {str(e)}"}
+                record['finished_at'] = datetime.now(timezone.utc).isoformat()
+                append_journal(journal, record)
+                counts[record['status']] += 1
+                finished = sum(counts.values())
+                logger.info("[%d/%d] %s %s in %.1fs, %.1f videos/min", finished, len(pending), video_id,
+                            record['status'], record.get('elapsed', 0), finished / (time.monotonic() - started) * 60)
+        except KeyboardInterrupt:
+            # Everything journaled so far is kept; the next run picks up the rest
+            pool.shutdown(wait=False, cancel_futures=True)
+            logger.warning("Interrupted, rerun the same command to resume")
+            return 130
+
+    elapsed = time.monotonic() - started
+    logger.info("Finished: %d done, %d partial, %d failed in %.1fs", counts['done'], counts['partial'],
+                counts['failed'], elapsed)
+    return 0 if not counts['failed'] and not counts['partial'] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
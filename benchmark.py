@@ -0,0 +1,465 @@
+import argparse
+import html
+import json
+import logging
+import os
+import platform
+import random
+import re
+import resource
+import shutil
+import statistics
+import struct
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from multiprocessing import get_context
+from urllib.parse import parse_qs, urlparse
+
+# Every run does the full work: no cached transcripts or translations, and no Whisper model
+# to download. The stand-in translator has no quota, so the client rate limit is raised.
+# Set any of these in the environment to benchmark a different configuration.
+os.environ.setdefault('TRANSCRIPT_CACHE', '0')
+os.environ.setdefault('TRANSLATION_MEMORY', '0')
+os.environ.setdefault('ASR_BACKEND', 'stub')
+os.environ.setdefault('TRANSLATE_RPS', '50')
+os.environ.setdefault('TRANSLATE_BURST', '10')
+os.environ.setdefault('METRICS_PORT', '0')
+# Without ffmpeg the audio is downloaded and handed to the stub ASR as a file instead
+if not shutil.which('ffmpeg'):
+    os.environ.setdefault('WHISPER_STREAMING', '0')
+
+logger = logging.getLogger(__name__)
+
+# Video length in seconds per profile; the stand-ins size every payload from it
+PROFILES = {
+    'short': 5 * 60,
+    'lecture': 60 * 60,
+    'long': 4 * 3600,
+}
+STAGES = ['status', 'transcript', 'captions', 'audio', 'asr', 'translation', 'process_video']
+# Page script cost, independent of the video: imports, first run and a widget-triggered rerun
+STARTUP_STAGES = ['imports', 'cold_start', 'rerun']
+# Import budget for the page scripts: what app.py and main.py import on top of streamlit must
+# load within this many milliseconds (python -X importtime, cumulative). yt-dlp, the
+# transcript API, deep-translator, bs4, langdetect and requests are loaded by a background
+# thread (jobs.start_preload) and must not appear on this path.
+IMPORT_BUDGET_MS = float(os.environ.get('IMPORT_BUDGET_MS', 50))
+PAGE_MODULES = ['segments', 'transcript_cache', 'whisper_pool', 'language', 'jobs', 'metrics', 'playlists', 'ui']
+PAGE_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app.py')
+RERUNS = 10
+SEGMENT_SECONDS = 4
+# Stand-in video ids carry the video length: "bench" + six digits of seconds
+_BENCH_ID = re.compile(r'bench(\d{6})')
+_SILENCE = bytes(1024 * 1024)
+WAV_HEADER_BYTES = 44
+
+
+def bench_video_id(seconds):
+    return f"bench{seconds:06d}"
+
+
+def _wav_header(data_size, byte_rate):
+    # 16-bit mono PCM at byte_rate / 2 Hz; the zero samples after it decode as silence
+    sample_rate = byte_rate // 2
+    return (b'RIFF' + struct.pack('<I', 36 + data_size) + b'WAVE'
+            + b'fmt ' + struct.pack('<IHHIIHH', 16, 1, 1, sample_rate, sample_rate * 2, 2, 16)
+            + b'data' + struct.pack('<I', data_size))
+
+
+def _sentence(i):
+    return f"This is sentence number {i} of the benchmark lecture, about {i % 17} things."
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    # Answers like YouTube's watch page and timedtext, yt-dlp's info, googlevideo and the
+    # Google Translate mobile page, after the configured latency and with the configured
+    # share of 503 (429 for the translator) responses
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        config = self.server.config
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        time.sleep(config['latency'])
+        self.server.count(url.path.split('/')[1])
+        if random.random() < config['error_rate']:
+            self._send(429 if url.path == '/translate' else 503, b"stand-in error", 'text/plain')
+            return
+
+        if url.path == '/translate':
+            text = html.escape(query.get('q', [''])[0])
+            self._send(200, f'<div class="result-container">{text}</div>'.encode('utf-8'), 'text/html')
+            return
+
+        match = _BENCH_ID.search(url.path + url.query)
+        if not match:
+            self._send(404, b"unknown video", 'text/plain')
+            return
+        video_id, seconds = match.group(0), int(match.group(1))
+        base = f"http://{self.headers['Host']}"
+        if url.path.startswith('/info/'):
+            self._send(200, json.dumps(self._info(base, video_id, seconds)).encode('utf-8'), 'application/json')
+        elif url.path == '/watch':
+            self._send(200, self._watch_page(base, video_id).encode('utf-8'), 'text/html')
+        elif url.path.startswith('/timedtext/'):
+            self._send(200, self._timedtext(seconds).encode('utf-8'), 'text/xml')
+        elif url.path.startswith('/captions/'):
+            self._send(200, self._json3(seconds).encode('utf-8'), 'application/json')
+        elif url.path.startswith('/audio/'):
+            self._audio(seconds * config['audio_bytes_per_second'], config['audio_bytes_per_second'])
+        else:
+            self._send(404, b"not found", 'text/plain')
+
+    def _send(self, status, body, content_type, headers=()):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _info(self, base, video_id, seconds):
+        size = WAV_HEADER_BYTES + seconds * self.server.config['audio_bytes_per_second']
+        return {
+            'id': video_id,
+            'title': f"Benchmark video {video_id}",
+            'upload_date': '20200101',
+            'duration': seconds,
+            'formats': [{
+                'format_id': '140',
+                'url': f"{base}/audio/{video_id}?id={video_id}&itag=140&clen={size}",
+                'protocol': 'http',
+                'vcodec': 'none',
+                'acodec': 'pcm_s16le',
+                'ext': 'wav',
+                'abr': 128,
+            }],
+            'subtitles': {'en': [{'ext': 'json3', 'url': f"{base}/captions/{video_id}"}]},
+            'automatic_captions': {},
+        }
+
+    def _watch_page(self, base, video_id):
+        captions = {'playerCaptionsTracklistRenderer': {
+            'captionTracks': [{
+                'baseUrl': f"{base}/timedtext/{video_id}",
+                'name': {'simpleText': 'English'},
+                'languageCode': 'en',
+                'isTranslatable': False,
+            }],
+            'translationLanguages': [],
+        }}
+        return f'<html><script>var p = {{"playabilityStatus":{{}},"captions":{json.dumps(captions)},"videoDetails":{{}}}};</script></html>'
+
+    def _timedtext(self, seconds):
+        lines = [
+            f'<text start="{start}" dur="{SEGMENT_SECONDS}">{html.escape(_sentence(i))}</text>'
+            for i, start in enumerate(range(0, seconds, SEGMENT_SECONDS))
+        ]
+        return '<?xml version="1.0" encoding="utf-8" ?><transcript>' + ''.join(lines) + '</transcript>'
+
+    def _json3(self, seconds):
+        events = [
+            {'tStartMs': start * 1000, 'dDurationMs': SEGMENT_SECONDS * 1000, 'segs': [{'utf8': _sentence(i)}]}
+            for i, start in enumerate(range(0, seconds, SEGMENT_SECONDS))
+        ]
+        return json.dumps({'events': events})
+
+    def _audio(self, data_size, byte_rate):
+        # A real (silent) WAV file, so ffmpeg decodes it like any other audio stream
+        header = _wav_header(data_size, byte_rate)
+        size = len(header) + data_size
+        first, last = 0, size - 1
+        status, headers = 200, []
+        match = re.match(r'bytes=(\d+)-(\d*)', self.headers.get('Range', ''))
+        if match:
+            first = int(match.group(1))
+            last = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+            status, headers = 206, [('Content-Range', f"bytes {first}-{last}/{size}")]
+        self.send_response(status)
+        self.send_header('Content-Type', 'audio/wav')
+        self.send_header('Content-Length', str(last - first + 1))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        offset = first
+        while offset <= last:
+            if offset < len(header):
+                block = header[offset:last + 1]
+            else:
+                block = _SILENCE[:min(len(_SILENCE), last - offset + 1)]
+            self.wfile.write(block)
+            offset += len(block)
+
+
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, latency=0.0, error_rate=0.0, audio_bytes_per_second=16000, port=0):
+        super().__init__(('127.0.0.1', port), StandInHandler)
+        self.config = {'latency': latency, 'error_rate': error_rate, 'audio_bytes_per_second': audio_bytes_per_second}
+        self.requests = {}
+        self._lock = threading.Lock()
+
+    def count(self, endpoint):
+        with self._lock:
+            self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+class StandInYoutubeDL:
+    # Takes yt-dlp's place in video_info: one request to the stand-in's info endpoint
+    base_url = None
+
+    def __init__(self, opts=None):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def extract_info(self, url, download=False):
+        from http_pool import get_session
+
+        video_id = _BENCH_ID.search(url).group(0)
+        with get_session().get(f"{self.base_url}/info/{video_id}") as response:
+            response.raise_for_status()
+            return response.json()
+
+
+def install_stand_ins(base_url):
+    # Points yt-dlp, the transcript API and the translator at the stand-in server
+    import google_translate
+    import video_info
+    from youtube_transcript_api import _transcripts
+
+    StandInYoutubeDL.base_url = base_url
+    video_info.YoutubeDL = StandInYoutubeDL
+    _transcripts.WATCH_URL = base_url + '/watch?v={video_id}'
+    endpoint = google_translate._endpoint
+
+    def stand_in_endpoint(source, target):
+        _, source, target = endpoint(source, target)  # still validates the language pair
+        return base_url + '/translate', source, target
+
+    google_translate._endpoint = stand_in_endpoint
+
+
+def _peak_rss():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def run_stage(stage, seconds, target_lang):
+    # Runs in a fresh process, so peak RSS belongs to this stage alone. Inputs a stage needs
+    # from earlier stages are prepared before the clock starts.
+    import pipeline
+    from audio_download import download_audio
+
+    video_id = bench_video_id(seconds)
+    url = f"https://www.youtube.com/watch?v={video_id}"
+    prepared = None
+    if stage in ('audio', 'asr'):
+        prepared = pipeline.get_audio_stream_url(url)
+    elif stage == 'translation':
+        prepared = pipeline.fetch_transcript(video_id)
+    rss_before = _peak_rss()
+
+    started = time.perf_counter()
+    if stage == 'status':
+        ok, _ = pipeline.check_video_status(url)
+        units, unit = 1, 'videos'
+    elif stage == 'transcript':
+        transcript = pipeline.fetch_transcript(video_id)
+        ok, units, unit = transcript is not None, len(transcript['segments']) if transcript else 0, 'segments'
+    elif stage == 'captions':
+        transcript = pipeline.fetch_captions(url)
+        ok, units, unit = transcript is not None, len(transcript['segments']) if transcript else 0, 'segments'
+    elif stage == 'audio':
+        stats = {}
+        path = download_audio(prepared, stats=stats)
+        os.unlink(path)
+        ok, units, unit = True, stats.get('audio_bytes', 0), 'bytes'
+    elif stage == 'asr':
+        transcript = pipeline.transcribe_with_whisper(prepared)
+        ok, units, unit = transcript is not None, seconds if transcript else 0, 'audio_seconds'
+    elif stage == 'translation':
+        text, _ = pipeline.translate_transcript(prepared, target_lang)
+        ok, units, unit = '[Translation failed' not in text, len(pipeline.transcript_text(prepared)), 'chars'
+    elif stage == 'process_video':
+        translated, original = pipeline.process_video(url, target_lang)
+        ok, units, unit = original is not None, seconds, 'video_seconds'
+    else:
+        raise ValueError(f"Unknown stage {stage!r}")
+    wall = time.perf_counter() - started
+
+    return {'ok': ok, 'wall_seconds': wall, 'units': units, 'unit': unit,
+            'rss_before_bytes': rss_before, 'peak_rss_bytes': _peak_rss()}
+
+
+def _page_import_ms():
+    # Cumulative import time of the page modules, streamlit itself excluded
+    code = "import streamlit; " + "; ".join(f"import {name}" for name in PAGE_MODULES)
+    output = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], capture_output=True, text=True,
+                            cwd=os.path.dirname(PAGE_SCRIPT), check=True).stderr
+    total = 0
+    for line in output.splitlines():
+        parts = line.split('|')
+        if len(parts) == 3 and parts[2].strip() in PAGE_MODULES and not parts[2].startswith('  '):
+            total += int(parts[1])
+    return total / 1000
+
+
+def run_startup_stage(stage):
+    if stage == 'imports':
+        import_ms = _page_import_ms()
+        return {'ok': import_ms <= IMPORT_BUDGET_MS, 'wall_seconds': import_ms / 1000, 'units': 1, 'unit': 'imports',
+                'rss_before_bytes': _peak_rss(), 'peak_rss_bytes': _peak_rss()}
+
+    from streamlit.testing.v1 import AppTest
+
+    rss_before = _peak_rss()
+    started = time.perf_counter()
+    app = AppTest.from_file(PAGE_SCRIPT, default_timeout=60).run()
+    wall = time.perf_counter() - started
+    if stage == 'rerun':
+        # Steady state: the background preload and warm-up threads have finished
+        for thread in threading.enumerate():
+            if thread.name in ('pipeline-preload', 'whisper-warm-up'):
+                thread.join()
+        # Picking another target language is a typical interaction: the whole script runs again
+        times = []
+        for i in range(RERUNS):
+            started = time.perf_counter()
+            app.sidebar.selectbox[0].select_index(i % 5).run()
+            times.append(time.perf_counter() - started)
+        wall = statistics.median(times)
+    return {'ok': not app.exception, 'wall_seconds': wall, 'units': 1, 'unit': 'runs',
+            'rss_before_bytes': rss_before, 'peak_rss_bytes': _peak_rss()}
+
+
+def _init_worker(base_url):
+    logging.basicConfig(level=logging.WARNING, format="%(processName)s %(name)s: %(message)s")
+    install_stand_ins(base_url)
+
+
+def benchmark(server, profiles, stages, repeat, target_lang):
+    results = []
+    context = get_context('spawn')
+    jobs = [('startup', stage, run_startup_stage, (stage,)) for stage in stages if stage in STARTUP_STAGES]
+    jobs += [
+        (profile, stage, run_stage, (stage, PROFILES[profile], target_lang))
+        for profile in profiles for stage in stages if stage not in STARTUP_STAGES
+    ]
+    for profile, stage, func, args in jobs:
+        runs = []
+        for _ in range(repeat):
+            with ProcessPoolExecutor(max_workers=1, mp_context=context, initializer=_init_worker,
+                                     initargs=(server.base_url,)) as pool:
+                runs.append(pool.submit(func, *args).result())
+        wall = statistics.median(run['wall_seconds'] for run in runs)
+        result = {
+            'profile': profile,
+            'stage': stage,
+            'runs': len(runs),
+            'failures': sum(1 for run in runs if not run['ok']),
+            'wall_seconds': round(wall, 4),
+            'wall_seconds_all': [round(run['wall_seconds'], 4) for run in runs],
+            'throughput': round(runs[0]['units'] / wall, 2) if wall else None,
+            'unit': f"{runs[0]['unit']}/s",
+            'rss_before_bytes': max(run['rss_before_bytes'] for run in runs),
+            'peak_rss_bytes': max(run['peak_rss_bytes'] for run in runs),
+        }
+        logger.info("%s %s: %.3fs, %s %s, peak RSS %.0f MB%s", profile, stage, wall, result['throughput'],
+                    result['unit'], result['peak_rss_bytes'] / 2 ** 20,
+                    f", {result['failures']} failed" if result['failures'] else "")
+        results.append(result)
+    return results
+
+
+def regressions(results, baseline_path, tolerance):
+    # Stages whose median wall time grew by more than tolerance over the baseline file's
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = {(r['profile'], r['stage']): r for r in json.load(f)['results']}
+    slower = []
+    for result in results:
+        before = baseline.get((result['profile'], result['stage']))
+        if before and result['wall_seconds'] > before['wall_seconds'] * (1 + tolerance):
+            slower.append((result, before))
+    return slower
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline offline against local stand-ins for "
+                                                 "YouTube, googlevideo and Google Translate.")
+    parser.add_argument('--profile', action='append', choices=sorted(PROFILES),
+                        help="video length to simulate; repeat for several (default: short)")
+    parser.add_argument('--stage', action='append', choices=STARTUP_STAGES + STAGES,
+                        help="stage to run; repeat for several (default: all)")
+    parser.add_argument('--repeat', type=int, default=3, help="runs per stage; the median is reported")
+    parser.add_argument('--latency', type=float, default=0.05, help="stand-in latency per request, in seconds")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="share of stand-in requests that fail")
+    parser.add_argument('--audio-bytes-per-second', type=int, default=16000, help="audio stream size (16000 = 128 kbit/s)")
+    parser.add_argument('--target-lang', default='hi')
+    parser.add_argument('--output', default='benchmark.json', help="where the results are written")
+    parser.add_argument('--baseline', help="earlier results file; exit 1 if a stage got slower")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="allowed slowdown against the baseline")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    server = StandInServer(args.latency, args.error_rate, args.audio_bytes_per_second).start()
+    try:
+        results = benchmark(server, args.profile or ['short'], args.stage or STARTUP_STAGES + STAGES, args.repeat, args.target_lang)
+    finally:
+        server.shutdown()
+
+    report = {
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'config': {
+            'latency': args.latency,
+            'error_rate': args.error_rate,
+            'audio_bytes_per_second': args.audio_bytes_per_second,
+            'repeat': args.repeat,
+            'import_budget_ms': IMPORT_BUDGET_MS,
+            'env': {name: os.environ[name] for name in sorted(os.environ) if name.isupper() and name.startswith((
+                'ASR_', 'AUDIO_', 'HTTP_', 'TRANSCRIPT_', 'TRANSLATE_', 'TRANSLATION_', 'WHISPER_'))},
+        },
+        'stand_in_requests': server.requests,
+        'results': results,
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    logger.info("Wrote %s", args.output)
+
+    failed = [r for r in results if r['failures']]
+    if args.baseline:
+        for result, before in regressions(results, args.baseline, args.tolerance):
+            logger.error("Regression: %s %s took %.3fs, baseline %.3fs", result['profile'], result['stage'],
+                         result['wall_seconds'], before['wall_seconds'])
+            failed.append(result)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,169 @@
+import codecs
+import html
+import io
+import itertools
+import json
+import re
+import xml.etree.ElementTree as ET
+
+from http_pool import get_session
+
+READ_CHUNK_SIZE = 64 * 1024
+
+_VTT_TIMING = re.compile(r'^(\S+)\s+-->\s+(\S+)')
+_VTT_TAG = re.compile(r'<[^>]+>')
+
+
+def _segment(text, start, duration):
+    return {'text': text, 'start': start, 'duration': duration}
+
+
+def _decode(chunks):
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    for chunk in chunks:
+        text = decoder.decode(chunk)
+        if text:
+            yield text
+    tail = decoder.decode(b'', final=True)
+    if tail:
+        yield tail
+
+
+def parse_json3(chunks):
+    # Decodes the "events" array one object at a time instead of loading the whole document
+    decoder = json.JSONDecoder()
+    buffer = ''
+    in_events = False
+    for chunk in chunks:
+        buffer += chunk
+        if not in_events:
+            start = buffer.find('"events"')
+            bracket = buffer.find('[', start) if start >= 0 else -1
+            if bracket < 0:
+                continue
+            buffer = buffer[bracket + 1:]
+            in_events = True
+
+        pos = 0
+        while True:
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+                pos += 1
+            if pos >= len(buffer) or buffer[pos] == ']':
+                break
+            try:
+                event, pos_end = decoder.raw_decode(buffer, pos)
+            except ValueError:
+                break  # the object continues in the next chunk
+            pos = pos_end
+            text = ''.join(seg.get('utf8', '') for seg in event.get('segs') or [])
+            if text.strip():
+                yield _segment(text, event.get('tStartMs', 0) / 1000, event.get('dDurationMs', 0) / 1000)
+        buffer = buffer[pos:]
+
+
+def parse_srv(raw):
+    # srv3 uses <p t="ms" d="ms">, srv1/srv2 use <text start="s" dur="s">
+    for _, element in ET.iterparse(raw, events=('end',)):
+        if element.tag == 'p':
+            start, duration = int(element.get('t', 0)) / 1000, int(element.get('d', 0)) / 1000
+        elif element.tag == 'text':
+            start, duration = float(element.get('start', 0)), float(element.get('dur', 0))
+        else:
+            continue
+        text = html.unescape(''.join(element.itertext()))
+        element.clear()
+        if text.strip():
+            yield _segment(text, start, duration)
+
+
+def _vtt_seconds(timestamp):
+    parts = timestamp.replace(',', '.').split(':')
+    seconds = 0.0
+    for part in parts:
+        seconds = seconds * 60 + float(part)
+    return seconds
+
+
+def parse_vtt(lines):
+    timing = None
+    text_lines = []
+    for line in itertools.chain(lines, ['']):
+        line = line.rstrip('\r\n')
+        match = _VTT_TIMING.match(line)
+        if match:
+            timing = _vtt_seconds(match.group(1)), _vtt_seconds(match.group(2))
+            text_lines = []
+        elif not line:
+            # Only a truly empty line ends a cue; auto-captions use a lone space as a blank text line
+            if timing and any(text.strip() for text in text_lines):
+                start, end = timing
+                yield _segment('\n'.join(text_lines), start, end - start)
+            timing = None
+            text_lines = []
+        elif timing:
+            text_lines.append(html.unescape(_VTT_TAG.sub('', line)))
+
+
+def dedupe_rolling(segments):
+    # Auto-captions repeat the previous cue's line above each new line; keep each line once
+    deduped = []
+    previous_lines = []
+    for segment in segments:
+        lines = [line.strip() for line in segment['text'].split('\n') if line.strip()]
+        new_lines = [line for line in lines if line not in previous_lines]
+        previous_lines = lines
+        if not new_lines:
+            if deduped:
+                last = deduped[-1]
+                last['duration'] = max(last['duration'], segment['start'] + segment['duration'] - last['start'])
+            continue
+        deduped.append(_segment(' '.join(new_lines), segment['start'], segment['duration']))
+    return deduped
+
+
+class _ChunkReader(io.RawIOBase):
+    # File-like view over an iterator of byte chunks, for ElementTree.iterparse
+    def __init__(self, chunks):
+        self._chunks = chunks
+        self._pending = b''
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self._pending:
+            self._pending = next(self._chunks, b'')
+            if not self._pending:
+                return 0
+        size = min(len(buffer), len(self._pending))
+        buffer[:size] = self._pending[:size]
+        self._pending = self._pending[size:]
+        return size
+
+
+def _iter_lines(chunks):
+    pending = ''
+    for text in _decode(chunks):
+        pending += text
+        *lines, pending = pending.split('\n')
+        yield from lines
+    if pending:
+        yield pending
+
+
+def fetch_caption_segments(url, timeout=None):
+    # One request for the whole track; the format is sniffed from its first bytes
+    with get_session().get(url, stream=True, timeout=timeout) as response:
+        response.raise_for_status()
+        chunks = (chunk for chunk in response.iter_content(chunk_size=READ_CHUNK_SIZE) if chunk)
+        first = next(chunks, b'')
+        chunks = itertools.chain([first], chunks)
+        head = first.lstrip(b'\xef\xbb\xbf \t\r\n')
+
+        if head.startswith(b'{'):
+            segments = parse_json3(_decode(chunks))
+        elif head.startswith(b'<'):
+            segments = parse_srv(_ChunkReader(chunks))
+        else:
+            segments = parse_vtt(_iter_lines(chunks))
+        return dedupe_rolling(segments)
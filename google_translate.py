@@ -0,0 +1,38 @@
+from functools import lru_cache
+
+from bs4 import BeautifulSoup
+from deep_translator import GoogleTranslator
+from deep_translator.exceptions import RequestError, TooManyRequests, TranslationNotFound
+
+from http_pool import get_session
+from metrics import increment
+
+
+@lru_cache(maxsize=None)
+def _endpoint(source, target):
+    # GoogleTranslator validates and maps the language pair once per pair. Its instances
+    # mutate their URL parameters on every call and send with a fresh connection, so the
+    # request itself goes through the shared pool instead.
+    translator = GoogleTranslator(source=source, target=target)
+    return translator._base_url, translator.source, translator.target
+
+
+def google_translate(text, source, target):
+    # Same endpoint, parsing and exceptions as GoogleTranslator.translate
+    url, source, target = _endpoint(source, target)
+    text = text.strip()
+    if not text or source == target:
+        return text
+
+    with get_session().get(url, params={'tl': target, 'sl': source, 'q': text}) as response:
+        if response.status_code == 429:
+            increment('rate_limited', service='google_translate')
+            raise TooManyRequests()
+        if response.status_code != 200:
+            raise RequestError()
+        soup = BeautifulSoup(response.text, "html.parser")
+
+    element = soup.find("div", {"class": "t0"}) or soup.find("div", {"class": "result-container"})
+    if not element:
+        raise TranslationNotFound(text)
+    return element.get_text(strip=True)
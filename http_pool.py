@@ -0,0 +1,70 @@
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Keep-alive pools for this many hosts, each holding at most HTTP_POOL_PER_HOST connections
+HTTP_POOL_HOSTS = int(os.environ.get('HTTP_POOL_HOSTS', 16))
+HTTP_POOL_PER_HOST = int(os.environ.get('HTTP_POOL_PER_HOST', 8))
+HTTP_CONNECT_TIMEOUT = float(os.environ.get('HTTP_CONNECT_TIMEOUT', 5))
+HTTP_READ_TIMEOUT = float(os.environ.get('HTTP_READ_TIMEOUT', 30))
+TIMEOUT = (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)
+
+# One adapter owns every connection; pool_block makes a busy host wait for a free
+# connection instead of opening one past the limit and throwing it away afterwards
+_adapter = HTTPAdapter(pool_connections=HTTP_POOL_HOSTS, pool_maxsize=HTTP_POOL_PER_HOST, pool_block=True)
+_local = threading.local()
+
+
+class PooledSession(requests.Session):
+    # requests has no session-wide timeout; calls without one get the configured default
+    def __init__(self):
+        super().__init__()
+        self.mount('https://', _adapter)
+        self.mount('http://', _adapter)
+
+    def request(self, method, url, **kwargs):
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = TIMEOUT
+        return super().request(method, url, **kwargs)
+
+    def close(self):
+        pass  # the connections belong to the shared adapter, not to this session
+
+
+def get_session():
+    # Cookies and headers are per thread, so one caller's state never leaks into another's
+    # requests; the connections underneath are shared by every thread
+    session = getattr(_local, 'session', None)
+    if session is None:
+        session = _local.session = PooledSession()
+    return session
+
+
+def pool_stats():
+    # Connections are reused when requests outnumber the connections opened for them
+    hosts = {}
+    pools = _adapter.poolmanager.pools
+    for key in pools.keys():
+        try:
+            pool = pools[key]
+        except KeyError:
+            continue  # evicted while we were looking
+        idle = sum(1 for conn in list(pool.pool.queue) if conn is not None and conn.sock is not None)
+        hosts[f"{key.key_scheme}://{key.key_host}:{key.key_port}"] = {
+            'requests': pool.num_requests,
+            'connections_opened': pool.num_connections,
+            'in_use': pool.pool.maxsize - pool.pool.qsize(),
+            'idle': idle,
+        }
+
+    requests_made = sum(host['requests'] for host in hosts.values())
+    opened = sum(host['connections_opened'] for host in hosts.values())
+    return {
+        'requests': requests_made,
+        'connections_opened': opened,
+        'reuse_ratio': 1 - opened / requests_made if requests_made else 0.0,
+        'open_connections': sum(host['in_use'] + host['idle'] for host in hosts.values()),
+        'hosts': hosts,
+    }
@@ -0,0 +1,325 @@
+import logging
+import os
+import pickle
+import queue
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from sqlite_db import CACHE_DIR, ThreadConnections
+from stages import PipelineRun
+
+logger = logging.getLogger(__name__)
+
+# 'memory' keeps jobs in this process; 'sqlite' queues them in a file every server process can reach
+JOB_BACKEND = os.environ.get('JOB_BACKEND', 'memory')
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))
+JOB_DB_PATH = os.environ.get('JOB_DB_PATH', os.path.join(CACHE_DIR, "jobs.sqlite3"))
+# Finished jobs are kept this long so a reloaded page can still fetch the result
+JOB_TTL = int(os.environ.get('JOB_TTL', 3600))
+# A running job whose worker has not checked in for this long lost its process and goes back
+# to the queue; after JOB_MAX_CLAIMS such losses it fails instead
+JOB_LEASE = int(os.environ.get('JOB_LEASE', 60))
+JOB_MAX_CLAIMS = int(os.environ.get('JOB_MAX_CLAIMS', 3))
+
+QUEUED, RUNNING, DONE, FAILED = 'queued', 'running', 'done', 'failed'
+
+
+def _new_job(video_url, target_lang, attempts):
+    now = time.time()
+    return {
+        'id': uuid.uuid4().hex,
+        'video_url': video_url,
+        'target_lang': target_lang,
+        'attempts': attempts,
+        'status': QUEUED,
+        'claims': 0,
+        'done_chunks': 0,
+        'total_chunks': 0,
+        'chunks': [],
+        'outcome': None,
+        'submitted_at': now,
+        'first_output_at': None,
+        'finished_at': None,
+        'heartbeat_at': None,
+    }
+
+
+class MemoryJobStore:
+    def __init__(self):
+        self._jobs = {}
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+
+    def add(self, job):
+        with self._lock:
+            now = time.time()
+            for job_id in [i for i, j in self._jobs.items() if j['finished_at'] and j['finished_at'] < now - JOB_TTL]:
+                del self._jobs[job_id]
+            self._jobs[job['id']] = job
+        self._queue.put(job['id'])
+
+    def claim(self, timeout=1.0):
+        try:
+            job_id = self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            job.update(status=RUNNING, claims=job['claims'] + 1, heartbeat_at=time.time())
+            return dict(job)
+
+    def heartbeat(self, job_id):
+        self.update(job_id, heartbeat_at=time.time())
+
+    def update(self, job_id, **fields):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            job.update(fields)
+            return dict(job)
+
+    def add_chunk(self, job_id, index, total, text):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            if index == 0:
+                job['chunks'] = []  # a retried translation stage replays from the first chunk
+            job['chunks'].append(text)
+            job['done_chunks'], job['total_chunks'] = index + 1, total
+            job['first_output_at'] = job['first_output_at'] or time.time()
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job, chunks=list(job['chunks'])) if job else None
+
+
+class SqliteJobStore:
+    # Durable queue: any process pointing at the same file can submit, work on or poll jobs
+    COLUMNS = ('id', 'video_url', 'target_lang', 'attempts', 'status', 'claims', 'done_chunks', 'total_chunks',
+               'outcome', 'submitted_at', 'first_output_at', 'finished_at', 'heartbeat_at')
+
+    def __init__(self, path=JOB_DB_PATH):
+        self.path = path
+        # Autocommit: writes that span statements use explicit BEGIN IMMEDIATE transactions
+        self._connections = ThreadConnections(path, isolation_level=None, synchronous='FULL')
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id TEXT PRIMARY KEY, video_url TEXT, target_lang TEXT, attempts INTEGER, status TEXT, "
+                "claims INTEGER, done_chunks INTEGER, total_chunks INTEGER, outcome BLOB, "
+                "submitted_at REAL, first_output_at REAL, finished_at REAL, heartbeat_at REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, submitted_at)")
+            conn.execute("CREATE TABLE IF NOT EXISTS job_chunks (job_id TEXT, idx INTEGER, text TEXT, PRIMARY KEY (job_id, idx))")
+
+    def _connect(self):
+        return self._connections.get()
+
+    @contextmanager
+    def _transaction(self):
+        # BEGIN IMMEDIATE takes the write lock up front. A failure inside rolls back, so the
+        # thread's connection is never left holding an open transaction.
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def add(self, job):
+        expired = time.time() - JOB_TTL
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM job_chunks WHERE job_id IN (SELECT id FROM jobs WHERE finished_at < ?)", (expired,))
+            conn.execute("DELETE FROM jobs WHERE finished_at < ?", (expired,))
+            conn.execute(
+                f"INSERT INTO jobs ({', '.join(self.COLUMNS)}) VALUES ({', '.join('?' * len(self.COLUMNS))})",
+                [job[column] for column in self.COLUMNS],
+            )
+
+    def claim(self, timeout=1.0):
+        # Inside one write transaction, so two workers can't claim the same job
+        now = time.time()
+        with self._transaction() as conn:
+            self._expire_leases(conn, now)
+            row = conn.execute("SELECT id FROM jobs WHERE status = ? ORDER BY submitted_at LIMIT 1", (QUEUED,)).fetchone()
+            if row:
+                conn.execute("UPDATE jobs SET status = ?, claims = COALESCE(claims, 0) + 1, heartbeat_at = ? WHERE id = ?",
+                             (RUNNING, now, row[0]))
+        if not row:
+            time.sleep(timeout)
+            return None
+        return self.get(row[0])
+
+    def _expire_leases(self, conn, now):
+        # The process running these died: requeue them, or fail one that keeps taking its worker down
+        stale = conn.execute(
+            "SELECT id, COALESCE(claims, 0) FROM jobs WHERE status = ? AND COALESCE(heartbeat_at, 0) < ?",
+            (RUNNING, now - JOB_LEASE),
+        ).fetchall()
+        for job_id, claims in stale:
+            if claims < JOB_MAX_CLAIMS:
+                logger.warning("Job %s lost its worker, requeueing it", job_id)
+                conn.execute("UPDATE jobs SET status = ? WHERE id = ?", (QUEUED, job_id))
+            else:
+                logger.warning("Job %s lost its worker %d times, failing it", job_id, claims)
+                outcome = {'message': "The job stopped responding and was abandoned. Please try again."}
+                conn.execute("UPDATE jobs SET status = ?, outcome = ?, finished_at = ? WHERE id = ?",
+                             (FAILED, pickle.dumps(outcome), now, job_id))
+
+    def heartbeat(self, job_id):
+        self.update(job_id, heartbeat_at=time.time())
+
+    def update(self, job_id, **fields):
+        if 'outcome' in fields:
+            fields['outcome'] = pickle.dumps(fields['outcome'])
+        assignments = ', '.join(f"{name} = ?" for name in fields)
+        self._connect().execute(f"UPDATE jobs SET {assignments} WHERE id = ?", [*fields.values(), job_id])
+
+    def add_chunk(self, job_id, index, total, text):
+        with self._transaction() as conn:
+            if index == 0:
+                conn.execute("DELETE FROM job_chunks WHERE job_id = ?", (job_id,))
+            conn.execute("INSERT OR REPLACE INTO job_chunks (job_id, idx, text) VALUES (?, ?, ?)", (job_id, index, text))
+            conn.execute(
+                "UPDATE jobs SET done_chunks = ?, total_chunks = ?, first_output_at = COALESCE(first_output_at, ?) WHERE id = ?",
+                (index + 1, total, time.time(), job_id),
+            )
+
+    def get(self, job_id):
+        conn = self._connect()
+        row = conn.execute(f"SELECT {', '.join(self.COLUMNS)} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if not row:
+            return None
+        job = dict(zip(self.COLUMNS, row))
+        job['outcome'] = pickle.loads(job['outcome']) if job['outcome'] else None
+        job['chunks'] = [text for text, in conn.execute(
+            "SELECT text FROM job_chunks WHERE job_id = ? ORDER BY idx", (job_id,)
+        )]
+        return job
+
+
+class JobQueue:
+    # Runs the pipeline off the Streamlit script threads: submit() returns a job id at once,
+    # poll() reports progress and the outcome, and a worker pool does the work
+    def __init__(self, store, workers=JOB_WORKERS):
+        self.store = store
+        self._runs = {}  # (video_url, target_lang) -> (failed PipelineRun, failed at)
+        self._runs_lock = threading.Lock()
+        for i in range(workers):
+            threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True).start()
+
+    def submit(self, video_url, target_lang, attempts=None):
+        job = _new_job(video_url, target_lang, attempts)
+        self.store.add(job)
+        return job['id']
+
+    def poll(self, job_id):
+        return self.store.get(job_id)
+
+    def _take_run(self, job):
+        # Failed runs are kept in this process for JOB_TTL, so resubmitting resumes at the failed
+        # stage. A job takes its run out while it works on it: two jobs for the same video and
+        # language at once each get their own.
+        key = (job['video_url'], job['target_lang'])
+        now = time.time()
+        with self._runs_lock:
+            for stale in [k for k, (_, failed_at) in self._runs.items() if failed_at < now - JOB_TTL]:
+                del self._runs[stale]
+            kept = self._runs.pop(key, None)
+        run = kept[0] if kept else PipelineRun(job['video_url'], job['target_lang'])
+        if job['attempts']:
+            run.set_attempts(job['attempts'])
+        return key, run
+
+    def _keep_alive(self, job_id, finished):
+        # Renews the job's lease until it finishes, however long a single stage takes
+        while not finished.wait(JOB_LEASE / 3):
+            try:
+                self.store.heartbeat(job_id)
+            except Exception:
+                logger.exception("Heartbeat for job %s failed", job_id)
+
+    def _work(self):
+        # The worker outlives any one failure, e.g. a locked queue file; a job it was running
+        # when the store failed goes back to the queue once its lease runs out
+        while True:
+            try:
+                job = self.store.claim()
+                if job is not None:
+                    self._process(job)
+            except Exception:
+                logger.exception("Job worker error")
+                time.sleep(1)
+
+    def _process(self, job):
+        # Imported here so the page scripts can import this module without the pipeline
+        from http_pool import pool_stats
+        from pipeline import run_pipeline
+
+        key, run = self._take_run(job)
+
+        def on_chunk(index, total, translated, job_id=job['id']):
+            self.store.add_chunk(job_id, index, total, translated)
+
+        finished = threading.Event()
+        threading.Thread(target=self._keep_alive, args=(job['id'], finished),
+                         name=f"job-heartbeat-{job['id'][:8]}", daemon=True).start()
+        try:
+            outcome = run_pipeline(job['video_url'], job['target_lang'], on_chunk=on_chunk, run=run)
+            status = FAILED if 'error' in outcome else DONE
+        except Exception as e:
+            logger.exception("Job %s crashed", job['id'])
+            outcome, status = {'message': f"An unexpected error occurred: {str(e)}"}, FAILED
+        finally:
+            finished.set()
+        if status != DONE:
+            with self._runs_lock:
+                self._runs[key] = (run, time.time())
+        self.store.update(job['id'], status=status, outcome=outcome, finished_at=time.time())
+
+        stats = pool_stats()
+        logger.info("HTTP pool after job %s: %d requests, reuse ratio %.2f, %d open connections",
+                    job['id'], stats['requests'], stats['reuse_ratio'], stats['open_connections'])
+
+
+_queue = None
+_queue_lock = threading.Lock()
+_preload_started = False
+
+
+def get_job_queue():
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            store = SqliteJobStore() if JOB_BACKEND == 'sqlite' else MemoryJobStore()
+            _queue = JobQueue(store)
+        return _queue
+
+
+def _preload():
+    try:
+        import pipeline  # yt-dlp, the transcript API, deep-translator and bs4 load here
+        from language import init_detector
+
+        init_detector()
+    except Exception:
+        logger.exception("Preloading the pipeline failed")
+
+
+def start_preload():
+    # Safe to call on every Streamlit rerun; only the first call starts the thread
+    global _preload_started
+    with _queue_lock:
+        if _preload_started:
+            return
+        _preload_started = True
+    threading.Thread(target=_preload, name="pipeline-preload", daemon=True).start()
@@ -0,0 +1,122 @@
+import threading
+from functools import lru_cache
+
+from metrics import span
+
+# Characters handed to langdetect; more text barely changes the answer but costs linearly
+DETECT_SAMPLE_CHARS = 3000
+
+# Codes YouTube, Whisper and langdetect report that Google Translate spells differently
+_TRANSLATOR_CODES = {
+    'zh': 'zh-CN', 'zh-cn': 'zh-CN', 'zh-hans': 'zh-CN', 'zh-sg': 'zh-CN',
+    'zh-tw': 'zh-TW', 'zh-hant': 'zh-TW', 'zh-hk': 'zh-TW',
+    'he': 'iw', 'jv': 'jw', 'fil': 'tl', 'mni': 'mni-Mtei',
+}
+
+# Target languages offered by the front ends, by display name. Built once per process, not on
+# every Streamlit rerun.
+LANGUAGE_CODES = {
+    "Afrikaans": "af", "Albanian": "sq", "Amharic": "am", "Arabic": "ar",
+    "Armenian": "hy", "Assamese": "as", "Aymara": "ay", "Azerbaijani": "az",
+    "Bambara": "bm", "Basque": "eu", "Belarusian": "be", "Bengali": "bn",
+    "Bhojpuri": "bho", "Bosnian": "bs", "Bulgarian": "bg", "Catalan": "ca",
+    "Cebuano": "ceb", "Chichewa": "ny", "Chinese (Simplified)": "zh-CN",
+    "Chinese (Traditional)": "zh-TW", "Corsican": "co", "Croatian": "hr",
+    "Czech": "cs", "Danish": "da", "Dhivehi": "dv", "Dogri": "doi",
+    "Dutch": "nl", "English": "en", "Esperanto": "eo", "Estonian": "et",
+    "Ewe": "ee", "Filipino": "tl", "Finnish": "fi", "French": "fr",
+    "Frisian": "fy", "Galician": "gl", "Georgian": "ka", "German": "de",
+    "Greek": "el", "Guarani": "gn", "Gujarati": "gu", "Haitian Creole": "ht",
+    "Hausa": "ha", "Hawaiian": "haw", "Hebrew": "iw", "Hindi": "hi",
+    "Hmong": "hmn", "Hungarian": "hu", "Icelandic": "is", "Igbo": "ig",
+    "Ilocano": "ilo", "Indonesian": "id", "Irish": "ga", "Italian": "it",
+    "Japanese": "ja", "Javanese": "jw", "Kannada": "kn", "Kazakh": "kk",
+    "Khmer": "km", "Kinyarwanda": "rw", "Konkani": "gom", "Korean": "ko",
+    "Krio": "kri", "Kurdish (Kurmanji)": "ku", "Kurdish (Sorani)": "ckb",
+    "Kyrgyz": "ky", "Lao": "lo", "Latin": "la", "Latvian": "lv",
+    "Lingala": "ln", "Lithuanian": "lt", "Luganda": "lg", "Luxembourgish": "lb",
+    "Macedonian": "mk", "Maithili": "mai", "Malagasy": "mg", "Malay": "ms",
+    "Malayalam": "ml", "Maltese": "mt", "Maori": "mi", "Marathi": "mr",
+    "Meiteilon (Manipuri)": "mni-Mtei", "Mizo": "lus", "Mongolian": "mn",
+    "Myanmar": "my", "Nepali": "ne", "Norwegian": "no", "Odia (Oriya)": "or",
+    "Oromo": "om", "Pashto": "ps", "Persian": "fa", "Polish": "pl",
+    "Portuguese": "pt", "Punjabi": "pa", "Quechua": "qu", "Romanian": "ro",
+    "Russian": "ru", "Samoan": "sm", "Sanskrit": "sa", "Scots Gaelic": "gd",
+    "Sepedi": "nso", "Serbian": "sr", "Sesotho": "st", "Shona": "sn",
+    "Sindhi": "sd", "Sinhala": "si", "Slovak": "sk", "Slovenian": "sl",
+    "Somali": "so", "Spanish": "es", "Sundanese": "su", "Swahili": "sw",
+    "Swedish": "sv", "Tajik": "tg", "Tamil": "ta", "Tatar": "tt",
+    "Telugu": "te", "Thai": "th", "Tigrinya": "ti", "Tsonga": "ts",
+    "Turkish": "tr", "Turkmen": "tk", "Twi": "ak", "Ukrainian": "uk",
+    "Urdu": "ur", "Uyghur": "ug", "Uzbek": "uz", "Vietnamese": "vi",
+    "Welsh": "cy", "Xhosa": "xh", "Yiddish": "yi", "Yoruba": "yo",
+    "Zulu": "zu"
+}
+LANGUAGE_NAMES = {code: name for name, code in LANGUAGE_CODES.items()}
+LANGUAGE_OPTIONS = list(LANGUAGE_NAMES)
+DEFAULT_TARGET_INDEX = LANGUAGE_OPTIONS.index('hi')
+
+_detector_lock = threading.Lock()
+_detector_ready = False
+
+
+def to_translator_code(code):
+    if not code:
+        return None
+    code = code.replace('_', '-').lower()
+    if code in _TRANSLATOR_CODES:
+        return _TRANSLATOR_CODES[code]
+    return _TRANSLATOR_CODES.get(code.split('-')[0], code.split('-')[0])
+
+
+@lru_cache(maxsize=None)
+def _translator_codes():
+    from deep_translator import GoogleTranslator
+
+    return frozenset(GoogleTranslator().get_supported_languages(as_dict=True).values())
+
+
+def supported_translator_code(code):
+    # None for codes Google can't translate from: 'und', or Whisper-only ones like yue and bo
+    code = to_translator_code(code)
+    return code if code in _translator_codes() else None
+
+
+def init_detector():
+    # Loads langdetect's profiles once per process and pins its seed so results are repeatable
+    global _detector_ready
+    with _detector_lock:
+        if _detector_ready:
+            return
+        from langdetect import DetectorFactory
+        from langdetect.detector_factory import init_factory
+
+        DetectorFactory.seed = 0
+        init_factory()
+        _detector_ready = True
+
+
+def _sample(text, size=DETECT_SAMPLE_CHARS):
+    # Start, middle and end, so a foreign-language intro doesn't decide the whole video
+    if len(text) <= size:
+        return text
+    third = size // 3
+    middle = len(text) // 2
+    return " ".join([text[:third], text[middle - third // 2:middle + third // 2], text[-third:]])
+
+
+def detect_language(text):
+    from langdetect import detect
+    from langdetect.lang_detect_exception import LangDetectException
+
+    init_detector()
+    with span('detection'):
+        try:
+            return detect(_sample(text))
+        except LangDetectException:
+            return None
+
+
+def resolve_source_language(text, reported=None):
+    # Prefer what the transcript source reported; detect once otherwise; let Google guess last
+    return supported_translator_code(reported) or supported_translator_code(detect_language(text)) or 'auto'
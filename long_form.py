@@ -0,0 +1,196 @@
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from audio_stream import SAMPLE_RATE, pcm_windows
+
+logger = logging.getLogger(__name__)
+
+# Worker processes for long-form transcription, each with its own model; 1 turns it off
+WHISPER_PROCESSES = int(os.environ.get('WHISPER_PROCESSES', 1))
+LONG_FORM_WINDOW_SECONDS = int(os.environ.get('LONG_FORM_WINDOW_SECONDS', 60))
+LONG_FORM_OVERLAP_SECONDS = float(os.environ.get('LONG_FORM_OVERLAP_SECONDS', 2))
+# A window ends at the quietest point within this many seconds of its nominal end
+SILENCE_SEARCH_SECONDS = float(os.environ.get('SILENCE_SEARCH_SECONDS', 5))
+SILENCE_FRAME_SECONDS = 0.03
+# PCM is decoded in short reads and re-cut into windows here
+READ_SECONDS = 10
+
+_executor = None
+_executor_lock = threading.Lock()
+_worker_model = None
+
+
+def _quietest(pcm, start, end):
+    # Middle of the lowest-energy frame in pcm[start:end]
+    import numpy as np
+
+    frame = int(SILENCE_FRAME_SECONDS * SAMPLE_RATE)
+    count = (end - start) // frame
+    if count < 1:
+        return end
+    frames = pcm[start:start + count * frame].reshape(count, frame)
+    return start + int(np.argmin((frames ** 2).mean(axis=1))) * frame + frame // 2
+
+
+def silence_windows(chunks, window_seconds=LONG_FORM_WINDOW_SECONDS, overlap_seconds=LONG_FORM_OVERLAP_SECONDS,
+                    search_seconds=SILENCE_SEARCH_SECONDS):
+    # Re-cuts a stream of PCM arrays into (start sample, window) pairs. Each window ends at the
+    # quietest point near its nominal length, and the next one starts overlap_seconds before
+    # that cut so a word split by the cut is heard whole in at least one window.
+    import numpy as np
+
+    window = int(window_seconds * SAMPLE_RATE)
+    search = min(int(search_seconds * SAMPLE_RATE), window // 2)
+    overlap = int(overlap_seconds * SAMPLE_RATE)
+    buffer = np.empty(0, dtype=np.float32)
+    buffer_start = 0
+    emitted = False
+    for chunk in chunks:
+        buffer = np.concatenate([buffer, chunk])
+        while len(buffer) >= window:
+            cut = _quietest(buffer, window - search, window)
+            yield buffer_start, buffer[:cut]
+            emitted = True
+            next_start = max(cut - overlap, 1)
+            buffer = buffer[next_start:]
+            buffer_start += next_start
+    # After a cut the buffer always holds the overlap; it only needs its own window if
+    # there is audio past it
+    if len(buffer) > (overlap if emitted else 0):
+        yield buffer_start, buffer
+
+
+def _init_worker(model_name, threads):
+    global _worker_model
+    from asr_backends import load_asr_model
+
+    _worker_model = load_asr_model(model_name, threads=threads)
+
+
+def _transcribe_window(index, start_sample, pcm, language):
+    offset = start_sample / SAMPLE_RATE
+    before = _worker_model.snapshot()
+    result = _worker_model.transcribe(pcm, fp16=False, language=language, word_timestamps=True)
+    audio_seconds, wall_seconds = (after - start for after, start in zip(_worker_model.snapshot(), before))
+    segments = []
+    for segment in result["segments"]:
+        words = [
+            {'word': word["word"], 'start': offset + word["start"], 'end': offset + word["end"]}
+            for word in segment.get("words") or []
+        ]
+        segments.append({
+            'text': segment["text"].strip(),
+            'start': offset + segment["start"],
+            'end': offset + segment["end"],
+            'words': words,
+        })
+    return index, segments, result.get("language"), (audio_seconds, wall_seconds)
+
+
+def _get_executor():
+    # Spawned, not forked: the parent is a multi-threaded server and torch does not survive fork
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            from whisper_pool import WHISPER_MODEL
+
+            threads = max(1, (os.cpu_count() or 1) // WHISPER_PROCESSES)
+            _executor = ProcessPoolExecutor(
+                max_workers=WHISPER_PROCESSES,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker,
+                initargs=(WHISPER_MODEL, threads),
+            )
+        return _executor
+
+
+def _reset_executor(executor):
+    global _executor
+    with _executor_lock:
+        if _executor is executor:
+            _executor = None
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _same_word(a, b):
+    return a['word'].strip(' .,!?').lower() == b['word'].strip(' .,!?').lower()
+
+
+def stitch(windows):
+    # windows: [(start seconds, end seconds, segments)] in order. Each overlap is split at its
+    # midpoint; words are kept by the window whose half they start in, and a word both windows
+    # heard across the split is kept once.
+    stitched = []
+    last_word = None
+    for i, (start, end, segments) in enumerate(windows):
+        low = (start + windows[i - 1][1]) / 2 if i > 0 else float('-inf')
+        high = (windows[i + 1][0] + end) / 2 if i + 1 < len(windows) else float('inf')
+        for segment in segments:
+            if not segment['words']:
+                middle = (segment['start'] + segment['end']) / 2
+                if low <= middle < high and segment['text']:
+                    stitched.append({'text': segment['text'], 'start': segment['start'],
+                                     'duration': segment['end'] - segment['start']})
+                continue
+            words = [word for word in segment['words'] if low <= word['start'] < high]
+            if words and last_word and _same_word(words[0], last_word) and words[0]['start'] < last_word['end']:
+                words = words[1:]
+            if not words:
+                continue
+            last_word = words[-1]
+            text = ''.join(word['word'] for word in words).strip()
+            if text:
+                stitched.append({'text': text, 'start': words[0]['start'],
+                                 'duration': words[-1]['end'] - words[0]['start']})
+    return stitched
+
+
+def transcribe_parallel(audio_url, stats=None, language=None):
+    # Same result as audio_stream.transcribe_stream: (segments, language). Windows are sent to
+    # the worker processes as soon as they are decoded; at most two per worker wait in memory.
+    # Without a language, the first window is transcribed alone and the language it detects
+    # is pinned for the rest, so a window of music or silence can't switch language.
+    executor = _get_executor()
+    in_flight = deque()
+    results = {}
+    bounds = {}
+    timings = []
+    started = time.perf_counter()
+
+    def collect(future):
+        index, segments, detected, timing = future.result()
+        results[index] = (segments, detected)
+        timings.append(timing)
+
+    try:
+        for index, (start_sample, pcm) in enumerate(silence_windows(pcm_windows(audio_url, READ_SECONDS, stats))):
+            bounds[index] = (start_sample / SAMPLE_RATE, (start_sample + len(pcm)) / SAMPLE_RATE)
+            in_flight.append(executor.submit(_transcribe_window, index, start_sample, pcm, language))
+            if language is None:
+                collect(in_flight.popleft())
+                language = results[index][1]
+            elif len(in_flight) >= 2 * WHISPER_PROCESSES:
+                collect(in_flight.popleft())
+        while in_flight:
+            collect(in_flight.popleft())
+    except BrokenProcessPool:
+        _reset_executor(executor)  # a worker died (e.g. out of memory); the next call starts fresh ones
+        raise
+    finally:
+        for future in in_flight:
+            future.cancel()
+
+    order = sorted(results)
+    # Backend rtf is compute per audio second in one worker; wall rtf includes the parallelism
+    audio_seconds = sum(seconds for seconds, _ in timings)
+    if audio_seconds:
+        logger.info("Transcribed %d windows on %d processes: backend rtf=%.3f, wall rtf=%.3f", len(order),
+                    WHISPER_PROCESSES, sum(wall for _, wall in timings) / audio_seconds,
+                    (time.perf_counter() - started) / audio_seconds)
+    return stitch([(*bounds[i], results[i][0]) for i in order]), language
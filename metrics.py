@@ -0,0 +1,178 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+# Prometheus text endpoint at http://METRICS_HOST:METRICS_PORT/metrics; 0 turns it off
+METRICS_PORT = int(os.environ.get('METRICS_PORT', 9464))
+METRICS_HOST = os.environ.get('METRICS_HOST', '127.0.0.1')
+# One JSON line per span and counter change on stderr
+METRICS_JSON_LOG = os.environ.get('METRICS_JSON_LOG', '0') == '1'
+# Quantiles are taken over this many most recent spans of each name
+METRICS_WINDOW = int(os.environ.get('METRICS_WINDOW', 1000))
+QUANTILES = (0.5, 0.95)
+PREFIX = 'transcripter'
+
+_lock = threading.Lock()
+_recent = {}
+_totals = {}
+_values = {}
+_counters = Counter()
+_server = None
+
+
+def _labels_key(labels):
+    return tuple(sorted((name, str(value)) for name, value in labels.items() if value is not None))
+
+
+def _log(event, **fields):
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(json.dumps(dict(event=event, time=round(time.time(), 3), **fields), ensure_ascii=False))
+
+
+def observe(name, seconds, ok=True, **labels):
+    with _lock:
+        _recent.setdefault(name, deque(maxlen=METRICS_WINDOW)).append(seconds)
+        count, total = _totals.get(name, (0, 0.0))
+        _totals[name] = (count + 1, total + seconds)
+        if not ok:
+            _counters[('errors', _labels_key({'span': name}))] += 1
+    _log('span', span=name, seconds=round(seconds, 4), ok=ok, **labels)
+
+
+def observe_value(name, value):
+    # A distribution of something other than time, e.g. bytes per video; exported as a summary
+    with _lock:
+        recent, count, total = _values.get(name) or (deque(maxlen=METRICS_WINDOW), 0, 0)
+        recent.append(value)
+        _values[name] = (recent, count + 1, total + value)
+    _log('value', name=name, value=value)
+
+
+@contextmanager
+def span(name, **labels):
+    # Times the block under `name`; a block that raises counts as an error and still re-raises
+    started = time.perf_counter()
+    ok = False
+    try:
+        yield
+        ok = True
+    finally:
+        observe(name, time.perf_counter() - started, ok, **labels)
+
+
+def increment(name, amount=1, **labels):
+    with _lock:
+        _counters[(name, _labels_key(labels))] += amount
+    _log('counter', counter=name, amount=amount, **labels)
+
+
+def _quantile(ordered, q):
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def latencies():
+    # {span name: {'count', 'p50', 'p95'}} over the recent window of each span
+    with _lock:
+        recent = {name: sorted(samples) for name, samples in _recent.items() if samples}
+        totals = dict(_totals)
+    return {
+        name: {'count': totals[name][0], 'p50': _quantile(ordered, 0.5), 'p95': _quantile(ordered, 0.95)}
+        for name, ordered in recent.items()
+    }
+
+
+def counters():
+    with _lock:
+        return {(name, labels): value for (name, labels), value in _counters.items()}
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in labels)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped)) + '}'
+
+
+def prometheus_text():
+    # Spans are summaries of seconds labelled by span name; counters are <name>_total
+    lines = []
+    with _lock:
+        recent = {name: sorted(samples) for name, samples in _recent.items() if samples}
+        totals = dict(_totals)
+        counter_items = sorted(_counters.items())
+        values = {name: (sorted(recent), count, total) for name, (recent, count, total) in _values.items() if recent}
+
+    if recent:
+        lines.append(f"# HELP {PREFIX}_span_seconds Time spent in each pipeline stage and request")
+        lines.append(f"# TYPE {PREFIX}_span_seconds summary")
+        for name in sorted(recent):
+            for q in QUANTILES:
+                labels = _format_labels((('span', name), ('quantile', str(q))))
+                lines.append(f"{PREFIX}_span_seconds{labels} {_quantile(recent[name], q):.6f}")
+            count, total = totals[name]
+            lines.append(f"{PREFIX}_span_seconds_sum{_format_labels((('span', name),))} {total:.6f}")
+            lines.append(f"{PREFIX}_span_seconds_count{_format_labels((('span', name),))} {count}")
+
+    for name in sorted(values):
+        ordered, count, total = values[name]
+        lines.append(f"# TYPE {PREFIX}_{name} summary")
+        for q in QUANTILES:
+            lines.append(f"{PREFIX}_{name}{_format_labels((('quantile', str(q)),))} {_quantile(ordered, q)}")
+        lines.append(f"{PREFIX}_{name}_sum {total}")
+        lines.append(f"{PREFIX}_{name}_count {count}")
+
+    typed = set()
+    for (name, labels), value in counter_items:
+        if name not in typed:
+            lines.append(f"# TYPE {PREFIX}_{name}_total counter")
+            typed.add(name)
+        lines.append(f"{PREFIX}_{name}_total{_format_labels(labels)} {value}")
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = prometheus_text().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_metrics_server(port=METRICS_PORT, host=METRICS_HOST):
+    # Once per process; Streamlit re-runs the page script on every interaction
+    global _server
+    with _lock:
+        if _server is not None or not port:
+            return _server or None
+        try:
+            _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+        except OSError as e:
+            logger.warning("Metrics endpoint not started on %s:%d (%s)", host, port, e)
+            _server = False
+            return None
+        _server.daemon_threads = True
+    threading.Thread(target=_server.serve_forever, name='metrics', daemon=True).start()
+    return _server
+
+
+if METRICS_JSON_LOG and not logger.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
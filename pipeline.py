@@ -0,0 +1,306 @@
+import logging
+import os
+from datetime import datetime
+from urllib.parse import urlparse, parse_qs
+from youtube_transcript_api import TranscriptsDisabled, NoTranscriptFound
+from youtube_transcript_api._transcripts import TranscriptListFetcher
+from http_pool import get_session
+from video_info import get_video_info, invalidate, caption_track, audio_format
+from captions import fetch_caption_segments
+from whisper_pool import whisper_model
+from asr_backends import ASR_BACKEND, install_hint
+from audio_stream import STREAMING, transcribe_stream
+from audio_download import download_audio
+from long_form import WHISPER_PROCESSES, transcribe_parallel
+from translation import iter_translate_batched
+from translation_backends import get_translation_backend
+from segmenter import TRANSLATE_UNIT_CHARS, split_text, split_sentences, chunk_ranges
+from segments import SegmentStore, align_translation
+from language import resolve_source_language
+from transcript_cache import get_transcript_cache, make_transcript, transcript_text
+from translation_memory import get_memory
+from metrics import increment
+from stages import (
+    StageError, StatusError, TranscriptError, CaptionsError, AudioError, ASRError, TranslationError,
+    PipelineRun, CheckpointMemory,
+)
+
+# Stage errors are logged here; the Streamlit front ends forward them to st.error
+logger = logging.getLogger(__name__)
+
+# Transcript languages to ask YouTube for, in order of preference
+TRANSCRIPT_LANGUAGES = ['en', 'hi']
+
+def get_video_id(url):
+    parsed_url = urlparse(url)
+    if parsed_url.hostname == 'youtu.be':
+        return parsed_url.path[1:]
+    if parsed_url.hostname in ['www.youtube.com', 'youtube.com']:
+        query = parse_qs(parsed_url.query)
+        return query.get('v', [None])[0]
+    return None
+
+def _status_stage(video_url):
+    video_id = get_video_id(video_url)
+    try:
+        info = get_video_info(video_url, video_id)
+    except Exception as e:
+        raise StatusError(f"Error checking video status: {str(e)}")
+
+    # Check if info is None first
+    if info is None:
+        raise StatusError("Failed to retrieve video information")
+
+    # Now safely check the info dictionary
+    upload_date = info.get('upload_date')
+    if upload_date:
+        try:
+            upload_time = datetime.strptime(upload_date, '%Y%m%d')
+            age_days = (datetime.now() - upload_time).days
+            if age_days < 1:
+                raise StatusError("Video recently uploaded, try after some time.", retryable=False)
+        except ValueError:
+            pass  # Skip date parsing if format is invalid
+
+    if info.get('is_live') or info.get('was_live'):
+        raise StatusError("Live streams are not supported.", retryable=False)
+
+    if info.get('live_status') == 'post_live':
+        # The next attempt has to see fresh metadata, not the cached post_live answer
+        invalidate(video_id or video_url)
+        raise StatusError("Live stream recording is still being processed.")
+
+    return True
+
+def check_video_status(video_url):
+    try:
+        _status_stage(video_url)
+        return True, "Video is ready."
+    except StageError as e:
+        return False, str(e)
+
+def _transcript_stage(video_id):
+    # None means the video has no usable transcript, which is a result, not an error
+    try:
+        # YouTubeTranscriptApi.list_transcripts opens and closes a session per call
+        transcript = TranscriptListFetcher(get_session()).fetch(video_id).find_transcript(TRANSCRIPT_LANGUAGES)
+        source = 'auto' if transcript.is_generated else 'manual'
+        return make_transcript(transcript.fetch(), transcript.language_code, source)
+    except (TranscriptsDisabled, NoTranscriptFound):
+        return None
+    except Exception as e:
+        raise TranscriptError(f"Transcript error: {str(e)}")
+
+def fetch_transcript(video_id):
+    try:
+        return _transcript_stage(video_id)
+    except StageError as e:
+        logger.error(str(e))
+        return None
+
+def fetch_captions_url(video_url, lang='en'):
+    try:
+        info = get_video_info(video_url, get_video_id(video_url))
+        track, _ = caption_track(info, lang)
+        return track['url'] if track else None
+    except Exception as e:
+        logger.error(f"Captions error: {str(e)}")
+        return None
+
+def _captions_stage(video_url):
+    # Downloads and parses the first caption track yt-dlp knows about; one HTTP request
+    try:
+        info = get_video_info(video_url, get_video_id(video_url))
+        for lang in TRANSCRIPT_LANGUAGES:
+            track, source = caption_track(info, lang)
+            if track:
+                segments = fetch_caption_segments(track['url'])
+                return make_transcript(segments, lang, source) if segments else None
+        return None
+    except Exception as e:
+        raise CaptionsError(f"Captions error: {str(e)}")
+
+def fetch_captions(video_url):
+    try:
+        return _captions_stage(video_url)
+    except StageError as e:
+        logger.error(str(e))
+        return None
+
+def _audio_stage(video_url):
+    try:
+        info = get_video_info(video_url, get_video_id(video_url))
+        fmt = audio_format(info)
+        return fmt['url'] if fmt else None
+    except Exception as e:
+        raise AudioError(f"Audio stream error: {str(e)}")
+
+def get_audio_stream_url(video_url):
+    try:
+        return _audio_stage(video_url)
+    except StageError as e:
+        logger.error(str(e))
+        return None
+
+def _log_audio_bytes(audio_url, audio_stats):
+    query = parse_qs(urlparse(audio_url).query)
+    logger.info("audio_bytes=%d itag=%s", audio_stats.get('audio_bytes', 0), query.get('itag', ['?'])[0])
+
+def _log_rtf(model, before):
+    audio_seconds, wall_seconds = (after - start for after, start in zip(model.snapshot(), before))
+    if audio_seconds:
+        logger.info("asr_backend=%s rtf=%.3f audio_seconds=%.0f", model.name, wall_seconds / audio_seconds, audio_seconds)
+
+def _asr_stage(audio_url):
+    audio_stats = {}
+    try:
+        if WHISPER_PROCESSES > 1:
+            # Long-form mode: overlapping windows are transcribed on several cores at once
+            segments, language = transcribe_parallel(audio_url, stats=audio_stats)
+            _log_audio_bytes(audio_url, audio_stats)
+            return make_transcript(segments, language, 'whisper')
+
+        if STREAMING:
+            with whisper_model() as model:
+                before = model.snapshot()
+                segments, language = transcribe_stream(model, audio_url, stats=audio_stats)
+                _log_rtf(model, before)
+            _log_audio_bytes(audio_url, audio_stats)
+            return make_transcript(segments, language, 'whisper')
+
+        # A retry after a dropped connection only fetches the ranges still missing
+        audio_path = download_audio(audio_url, stats=audio_stats)
+        _log_audio_bytes(audio_url, audio_stats)
+
+        with whisper_model() as model:
+            before = model.snapshot()
+            result = model.transcribe(audio_path, fp16=False)
+            _log_rtf(model, before)
+
+        os.unlink(audio_path)
+        segments = [
+            {'text': segment["text"].strip(), 'start': segment["start"], 'duration': segment["end"] - segment["start"]}
+            for segment in result["segments"]
+        ]
+        return make_transcript(segments, result.get("language"), 'whisper')
+
+    except ImportError as e:
+        raise ASRError(f"ASR backend {ASR_BACKEND} not installed ({e}). Run: {install_hint()}", retryable=False)
+    except Exception as e:
+        raise ASRError(f"Whisper error: {str(e)}")
+
+def transcribe_with_whisper(audio_url):
+    try:
+        return _asr_stage(audio_url)
+    except StageError as e:
+        logger.error(str(e))
+        return None
+
+def _translate_chunks(chunks, source_lang, target_lang, on_chunk=None, memory=None):
+    # Returns one result per chunk, None where every retry failed. on_chunk(index, total,
+    # translated) is called in order as each chunk becomes available.
+    backend = get_translation_backend()
+    results = []
+    for i, translated in iter_translate_batched(chunks, backend, source_lang, target_lang, memory):
+        results.append(translated)
+        if on_chunk:
+            on_chunk(i, len(chunks), _failed_placeholder(i) if translated is None else translated)
+    return results
+
+def _failed_placeholder(i):
+    return f"[Translation failed for chunk {i + 1}]"
+
+def _with_placeholders(results):
+    return [_failed_placeholder(i) if translated is None else translated for i, translated in enumerate(results)]
+
+def translate_text_dynamic_lang_detection(text, target_lang, source_lang=None, on_chunk=None):
+    # Resolved once per transcript so every chunk is translated from the same language
+    source_lang = resolve_source_language(text, source_lang)
+    return "\n\n".join(_with_placeholders(_translate_chunks(split_text(text, TRANSLATE_UNIT_CHARS), source_lang, target_lang, on_chunk)))
+
+def translate_transcript(transcript, target_lang, on_chunk=None, memory=None, strict=False):
+    # Chunks follow segment boundaries, so each translated chunk keeps its time span. They are
+    # kept short for close subtitle timing; the backend packs several into each request.
+    # Returns the display text and a SegmentStore of timed translated cues for SRT/VTT export.
+    # With strict=True, failed chunks raise a TranslationError that still carries that output.
+    store = transcript['segments']
+    source_lang = resolve_source_language(store.text, transcript['language'])
+    ranges = chunk_ranges(store, TRANSLATE_UNIT_CHARS)
+    chunks = [store.span_text(first, last) for first, last in ranges]
+    results = _translate_chunks(chunks, source_lang, target_lang, on_chunk, memory)
+    translated_chunks = _with_placeholders(results)
+
+    cues = []
+    for (first, last), translated in zip(ranges, translated_chunks):
+        cues.extend(align_translation(store, first, last, split_sentences(translated)))
+    output = "\n\n".join(translated_chunks), SegmentStore.from_segments(cues)
+
+    failed = results.count(None)
+    if strict and failed:
+        raise TranslationError(f"Translation failed for {failed} of {len(chunks)} chunks", partial=output,
+                               failed_chunks=failed)
+    return output
+
+def _acquire_transcript(run, video_url, video_id):
+    # A cached transcript skips yt-dlp, the transcript API and Whisper entirely
+    cache = get_transcript_cache()
+    transcript = cache.get(video_id, TRANSCRIPT_LANGUAGES) if cache else None
+    if cache:
+        increment('cache_hits' if transcript else 'cache_misses', cache='transcript')
+    if transcript:
+        return transcript
+
+    run.stage('status', _status_stage, video_url)
+    transcript = run.stage('transcript', _transcript_stage, video_id)
+    if not transcript:
+        transcript = run.stage('captions', _captions_stage, video_url)
+    if not transcript:
+        audio_url = run.stage('audio', _audio_stage, video_url)
+        if audio_url:
+            transcript = run.stage('asr', _asr_stage, audio_url)
+
+    if transcript and cache:
+        cache.put(video_id, transcript)
+    return transcript
+
+def run_pipeline(video_url, target_lang='hi', on_chunk=None, run=None):
+    # Returns a dict with 'message' (and 'error' for stage failures) when there is no result,
+    # otherwise 'transcript', 'translated', 'translation' (timed cues; None when no target
+    # language is given) and 'failed_chunks', the number of chunks left untranslated. Pass
+    # the same PipelineRun again to resume after a failure.
+    video_id = get_video_id(video_url)
+    if not video_id:
+        return {'message': "Invalid YouTube URL"}
+    run = run or PipelineRun(video_url, target_lang)
+
+    try:
+        transcript = _acquire_transcript(run, video_url, video_id)
+        if not transcript or not transcript_text(transcript):
+            return {'message': "Could not retrieve transcript or captions"}
+
+        if not target_lang:
+            return {'transcript': transcript, 'translated': transcript_text(transcript), 'translation': None,
+                    'failed_chunks': 0}
+
+        memory = CheckpointMemory(run.translated_chunks, get_memory())
+        failed_chunks = 0
+        try:
+            translated, translation = run.stage('translation', translate_transcript, transcript, target_lang, on_chunk, memory, True)
+        except TranslationError as e:
+            # Out of retries: hand back what was translated, with the failed chunks marked
+            translated, translation = e.partial
+            failed_chunks = e.failed_chunks
+        return {'transcript': transcript, 'translated': translated, 'translation': translation,
+                'failed_chunks': failed_chunks}
+    except StageError as e:
+        return {'message': str(e), 'error': e}
+
+def outcome_texts(outcome):
+    # (message, None) on failure, else (translated text, original text)
+    if 'message' in outcome:
+        return outcome['message'], None
+    return outcome['translated'], transcript_text(outcome['transcript'])
+
+
+def process_video(video_url, target_lang='hi', on_chunk=None, run=None):
+    return outcome_texts(run_pipeline(video_url, target_lang, on_chunk, run))
@@ -0,0 +1,61 @@
+import os
+import re
+from urllib.parse import parse_qs, urlparse
+
+from metrics import span
+
+# Entries read from one playlist or channel; the rest are ignored
+PLAYLIST_MAX_VIDEOS = int(os.environ.get('PLAYLIST_MAX_VIDEOS', 500))
+
+VIDEO_ID_RE = re.compile(r'^[A-Za-z0-9_-]{11}$')
+_YOUTUBE_HOSTS = ('www.youtube.com', 'youtube.com', 'm.youtube.com')
+# /@handle, /channel/UC..., /c/name and /user/name, optionally followed by a tab
+_CHANNEL_PATH = re.compile(r'^/(@[^/]+|channel/[^/]+|c/[^/]+|user/[^/]+)(?:/(videos|streams|shorts|featured))?/?$')
+
+
+def collection_url(url):
+    # Canonical playlist or channel URL, None for anything else. A watch URL with a list=
+    # parameter is a single video: that is what the viewer was looking at.
+    parsed = urlparse(url.strip())
+    if parsed.hostname not in _YOUTUBE_HOSTS:
+        return None
+    playlist_id = parse_qs(parsed.query).get('list', [None])[0]
+    if parsed.path == '/playlist' and playlist_id:
+        return f"https://www.youtube.com/playlist?list={playlist_id}"
+    match = _CHANNEL_PATH.match(parsed.path)
+    if match:
+        # A channel's home page lists tabs, not videos
+        tab = match.group(2) if match.group(2) in ('streams', 'shorts') else 'videos'
+        return f"https://www.youtube.com/{match.group(1)}/{tab}"
+    return None
+
+
+def list_collection(url, limit=PLAYLIST_MAX_VIDEOS):
+    # Flat extraction: a few requests for the listing pages and none per video. Returns
+    # {'title', 'entries': [{'id', 'url', 'title', 'duration'}], 'duplicates'} with each
+    # video once, in playlist order.
+    from video_info import YDL_OPTS, YoutubeDL
+
+    opts = dict(YDL_OPTS, extract_flat='in_playlist', playlistend=limit)
+    opts.pop('format', None)
+    with span('playlist'), YoutubeDL(opts) as ydl:
+        info = ydl.extract_info(collection_url(url) or url, download=False)
+
+    entries = []
+    seen = set()
+    duplicates = 0
+    for entry in (info or {}).get('entries') or []:
+        video_id = (entry or {}).get('id')
+        if not video_id or not VIDEO_ID_RE.match(video_id):
+            continue  # nested tabs or playlists, and deleted or private placeholders
+        if video_id in seen:
+            duplicates += 1
+            continue
+        seen.add(video_id)
+        entries.append({
+            'id': video_id,
+            'url': f"https://www.youtube.com/watch?v={video_id}",
+            'title': entry.get('title') or video_id,
+            'duration': entry.get('duration'),
+        })
+    return {'title': (info or {}).get('title') or url, 'entries': entries, 'duplicates': duplicates}
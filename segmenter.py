@@ -0,0 +1,128 @@
+import os
+import re
+
+# Chunk limits for the translation provider; Google Translate rejects requests above 5000 chars
+TRANSLATE_MAX_CHARS = int(os.environ.get('TRANSLATE_MAX_CHARS', 2000))
+TRANSLATE_MAX_BYTES = int(os.environ.get('TRANSLATE_MAX_BYTES', 0))  # 0 means no byte limit
+# Transcripts are translated in units of about this size (a few sentences or caption lines),
+# which are then packed into requests of up to TRANSLATE_MAX_CHARS
+TRANSLATE_UNIT_CHARS = int(os.environ.get('TRANSLATE_UNIT_CHARS', 500))
+
+# Latin terminators need trailing whitespace ("3.5" is not a sentence end); CJK, Indic,
+# Arabic/Urdu, Ethiopic, Armenian and Myanmar terminators end a sentence on their own.
+_SENTENCE_END = re.compile(
+    r'[.!?…]+["\'”’»)\]]*\s+'
+    r'|[。！？]+[」』”’）]*\s*'
+    r'|[।॥۔؟։።။]+\s*'
+)
+_LAST_SPACE = re.compile(r'\s(?=\S*$)')
+_ENDS_SENTENCE = re.compile(r'[.!?…。！？।॥۔؟։።။]["\'”’»)\]」』）]*$')
+
+
+def split_sentences(text):
+    sentences = []
+    pos = 0
+    for match in _SENTENCE_END.finditer(text):
+        sentences.append(text[pos:match.end()])
+        pos = match.end()
+    if pos < len(text):
+        sentences.append(text[pos:])
+    return [s for s in sentences if s.strip()]
+
+
+def _fits(text, max_chars, max_bytes):
+    if len(text) > max_chars:
+        return False
+    return not max_bytes or len(text.encode('utf-8')) <= max_bytes
+
+
+def _cut(text, max_chars, max_bytes):
+    # Longest prefix within the limits, ending on whitespace when there is any
+    low, high = 1, min(len(text), max_chars)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if _fits(text[:mid], max_chars, max_bytes):
+            low = mid
+        else:
+            high = mid - 1
+    end = low
+    if end < len(text):
+        space = _LAST_SPACE.search(text[:end])
+        if space and space.start() > 0:
+            end = space.end()
+    return end
+
+
+def _pieces(unit, max_chars, max_bytes):
+    # Unpunctuated auto-captions arrive as one huge "sentence"; break it on word
+    # boundaries, or hard-cut scripts written without spaces
+    while not _fits(unit.strip(), max_chars, max_bytes):
+        end = _cut(unit, max_chars, max_bytes)
+        yield unit[:end]
+        unit = unit[end:]
+    if unit.strip():
+        yield unit
+
+
+def pack_chunks(units, max_chars=TRANSLATE_MAX_CHARS, max_bytes=TRANSLATE_MAX_BYTES):
+    # Greedily fills each chunk up to the limits; units keep their own trailing separators
+    chunks = []
+    current = ''
+    for unit in units:
+        for piece in _pieces(unit, max_chars, max_bytes):
+            if current and not _fits((current + piece).strip(), max_chars, max_bytes):
+                chunks.append(current.strip())
+                current = ''
+            current += piece
+    if current.strip():
+        chunks.append(current.strip())
+    return chunks
+
+
+def pack_batches(texts, max_chars=TRANSLATE_MAX_CHARS, max_bytes=TRANSLATE_MAX_BYTES, max_items=None,
+                 separator="\n"):
+    # Groups consecutive texts into lists of indices whose texts, joined by separator, stay
+    # within the limits; a text above the limits on its own gets a batch of its own
+    batches = []
+    current = []
+    joined = ''
+    for i, text in enumerate(texts):
+        candidate = joined + separator + text if current else text
+        if current and (not _fits(candidate, max_chars, max_bytes) or (max_items and len(current) >= max_items)):
+            batches.append(current)
+            current = []
+            candidate = text
+        current.append(i)
+        joined = candidate
+    if current:
+        batches.append(current)
+    return batches
+
+
+def split_text(text, max_chars=TRANSLATE_MAX_CHARS, max_bytes=TRANSLATE_MAX_BYTES, segments=None):
+    # Sentences are the preferred unit; caption segments take over when the text has no
+    # usable punctuation
+    units = split_sentences(text)
+    if segments and len(units) <= 1:
+        units = [segment.rstrip() + ' ' for segment in segments]
+    return pack_chunks(units, max_chars, max_bytes)
+
+
+def chunk_ranges(store, max_chars=TRANSLATE_MAX_CHARS, max_bytes=TRANSLATE_MAX_BYTES):
+    # Packs whole segments of a SegmentStore into (first, last) ranges so every chunk maps back
+    # to a time span. Cuts after a sentence-ending segment when one is in the second half of the
+    # chunk; a single segment above the limit becomes its own range.
+    ranges = []
+    first = 0
+    sentence_end = None
+    for i in range(len(store)):
+        if i > first and not _fits(store.span_text(first, i + 1), max_chars, max_bytes):
+            cut = sentence_end if sentence_end and sentence_end - first > (i - first) // 2 else i
+            ranges.append((first, cut))
+            first = cut
+            sentence_end = None
+        if _ENDS_SENTENCE.search(store.segment_text(i)):
+            sentence_end = i + 1
+    if first < len(store):
+        ranges.append((first, len(store)))
+    return ranges
@@ -0,0 +1,112 @@
+import struct
+from array import array
+
+# Cache blobs start with this tag; anything else is the older JSON list of segment dicts
+STORE_MAGIC = b'SEG1'
+
+
+class SegmentStore:
+    # Timed transcript segments without a Python object per segment: start and duration live in
+    # float32 columns and all text in one string, segments separated by a single space. Segment
+    # i is text[offsets[i]:offsets[i + 1] - 1], so the full transcript is `text` itself.
+    __slots__ = ('starts', 'durations', 'offsets', 'text')
+
+    def __init__(self, starts=None, durations=None, offsets=None, text=''):
+        self.starts = starts if starts is not None else array('f')
+        self.durations = durations if durations is not None else array('f')
+        self.offsets = offsets if offsets is not None else array('I', [0])
+        self.text = text
+
+    @classmethod
+    def from_segments(cls, segments):
+        # Accepts any iterable of {'text', 'start', 'duration'} dicts, including generators
+        starts, durations, offsets = array('f'), array('f'), array('I', [0])
+        parts = []
+        for segment in segments:
+            text = ' '.join(segment['text'].split())
+            if not text:
+                continue
+            starts.append(segment['start'])
+            durations.append(segment['duration'])
+            offsets.append(offsets[-1] + len(text) + 1)
+            parts.append(text)
+        return cls(starts, durations, offsets, ' '.join(parts))
+
+    def __len__(self):
+        return len(self.starts)
+
+    def segment_text(self, i):
+        return self.text[self.offsets[i]:self.offsets[i + 1] - 1]
+
+    def span_text(self, first, last):
+        # Text of segments first..last-1 as one slice of the buffer
+        return self.text[self.offsets[first]:self.offsets[last] - 1]
+
+    def end(self, i):
+        return self.starts[i] + self.durations[i]
+
+    def cues(self):
+        for i in range(len(self)):
+            yield self.starts[i], self.durations[i], self.segment_text(i)
+
+    def to_bytes(self):
+        # Native byte order; the cache is local to this host
+        return b''.join([
+            STORE_MAGIC,
+            struct.pack('<I', len(self)),
+            self.starts.tobytes(),
+            self.durations.tobytes(),
+            self.offsets.tobytes(),
+            self.text.encode('utf-8'),
+        ])
+
+    @classmethod
+    def from_bytes(cls, data):
+        count, = struct.unpack_from('<I', data, len(STORE_MAGIC))
+        pos = len(STORE_MAGIC) + 4
+        columns = []
+        for typecode, length in (('f', count), ('f', count), ('I', count + 1)):
+            column = array(typecode)
+            size = column.itemsize * length
+            column.frombytes(data[pos:pos + size])
+            columns.append(column)
+            pos += size
+        return cls(*columns, data[pos:].decode('utf-8'))
+
+
+def align_translation(store, first, last, sentences):
+    # Spreads the translated sentences of segments first..last-1 over their time span in
+    # proportion to length; good enough for subtitle cues without word alignment
+    if first >= last or not sentences:
+        return []
+    start, end = store.starts[first], store.end(last - 1)
+    total = sum(len(sentence) for sentence in sentences)
+    cues = []
+    position = start
+    for sentence in sentences:
+        duration = (end - start) * len(sentence) / total if total else 0
+        cues.append({'text': sentence, 'start': position, 'duration': duration})
+        position += duration
+    return cues
+
+
+def _timestamp(seconds, separator):
+    milliseconds = int(round(seconds * 1000))
+    hours, milliseconds = divmod(milliseconds, 3600000)
+    minutes, milliseconds = divmod(milliseconds, 60000)
+    seconds, milliseconds = divmod(milliseconds, 1000)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}{separator}{milliseconds:03d}"
+
+
+def to_srt(store):
+    lines = []
+    for i, (start, duration, text) in enumerate(store.cues(), 1):
+        lines.append(f"{i}\n{_timestamp(start, ',')} --> {_timestamp(start + duration, ',')}\n{text}\n")
+    return '\n'.join(lines)
+
+
+def to_vtt(store):
+    lines = ["WEBVTT\n"]
+    for start, duration, text in store.cues():
+        lines.append(f"{_timestamp(start, '.')} --> {_timestamp(start + duration, '.')}\n{text}\n")
+    return '\n'.join(lines)
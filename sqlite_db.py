@@ -0,0 +1,25 @@
+import os
+import sqlite3
+import threading
+
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "transcripter")
+
+
+class ThreadConnections:
+    # sqlite3 connections can't be shared across threads, so each thread gets its own. WAL
+    # mode lets readers and a writer work at once across threads and processes.
+    def __init__(self, path, isolation_level='', synchronous='NORMAL'):
+        self.path = path
+        self.isolation_level = isolation_level
+        self.synchronous = synchronous
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+
+    def get(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=self.isolation_level)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(f"PRAGMA synchronous={self.synchronous}")
+            self._local.conn = conn
+        return conn
@@ -0,0 +1,131 @@
+import logging
+import time
+from collections import Counter
+
+from metrics import increment, span
+
+logger = logging.getLogger(__name__)
+
+class StageError(Exception):
+    # Raised by a pipeline stage; `retryable` says whether running the stage again can help
+    stage = None
+
+    def __init__(self, message, retryable=True):
+        super().__init__(message)
+        self.retryable = retryable
+
+    def __reduce__(self):
+        # Keeps `retryable` when a failed outcome is pickled into the job queue
+        return type(self), (str(self), self.retryable)
+
+
+class StatusError(StageError):
+    stage = 'status'
+
+
+class TranscriptError(StageError):
+    stage = 'transcript'
+
+
+class CaptionsError(StageError):
+    stage = 'captions'
+
+
+class AudioError(StageError):
+    stage = 'audio'
+
+
+class ASRError(StageError):
+    stage = 'asr'
+
+
+class TranslationError(StageError):
+    stage = 'translation'
+
+    def __init__(self, message, retryable=True, partial=None, failed_chunks=0):
+        super().__init__(message, retryable)
+        self.partial = partial  # per-chunk results, None where a chunk failed
+        self.failed_chunks = failed_chunks
+
+    def __reduce__(self):
+        return type(self), (str(self), self.retryable, self.partial, self.failed_chunks)
+
+
+class RetryPolicy:
+    def __init__(self, attempts=3, base_delay=2.0, max_delay=30.0):
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt):
+        return min(self.max_delay, self.base_delay * 2 ** attempt)
+
+
+DEFAULT_POLICIES = {
+    'status': RetryPolicy(3, 5.0),
+    'transcript': RetryPolicy(3, 2.0),
+    'captions': RetryPolicy(3, 2.0),
+    'audio': RetryPolicy(3, 2.0),
+    'asr': RetryPolicy(2, 5.0),
+    'translation': RetryPolicy(2, 10.0),
+}
+
+
+class PipelineRun:
+    # Checkpoints for one video/target-language pair. Every finished stage keeps its output,
+    # including "nothing found" results, and translated chunks are kept one by one. Running
+    # the pipeline again with the same run resumes at the first unfinished stage.
+    def __init__(self, video_url, target_lang, attempts=None, policies=None):
+        self.video_url = video_url
+        self.target_lang = target_lang
+        self.policies = dict(DEFAULT_POLICIES, **(policies or {}))
+        if attempts:
+            self.set_attempts(attempts)
+        self.outputs = {}
+        self.translated_chunks = {}
+        self.attempts = Counter()
+
+    def set_attempts(self, attempts):
+        self.policies = {
+            name: RetryPolicy(attempts, policy.base_delay, policy.max_delay)
+            for name, policy in self.policies.items()
+        }
+
+    def stage(self, name, func, *args):
+        if name in self.outputs:
+            return self.outputs[name]
+
+        policy = self.policies[name]
+        for attempt in range(policy.attempts):
+            self.attempts[name] += 1
+            try:
+                with span(name):
+                    output = func(*args)
+            except StageError as e:
+                if not e.retryable or attempt + 1 >= policy.attempts:
+                    raise
+                increment('retries', operation=name)
+                delay = policy.delay(attempt)
+                logger.warning("Stage %s failed (%s), retrying in %.0fs", name, e, delay)
+                time.sleep(delay)
+            else:
+                self.outputs[name] = output
+                return output
+
+
+class CheckpointMemory:
+    # Translation-memory interface over the run's chunk checkpoint, falling back to the shared
+    # persistent memory; a retried translation stage only sends chunks that never came back
+    def __init__(self, checkpoint, memory=None):
+        self.checkpoint = checkpoint
+        self.memory = memory
+
+    def get(self, text, source, target):
+        if text in self.checkpoint:
+            return self.checkpoint[text]
+        return self.memory.get(text, source, target) if self.memory else None
+
+    def put(self, text, source, target, translation):
+        self.checkpoint[text] = translation
+        if self.memory:
+            self.memory.put(text, source, target, translation)
@@ -0,0 +1,118 @@
+import os
+import sqlite3
+import struct
+import threading
+import time
+import zlib
+
+from segments import SegmentStore
+from sqlite_db import CACHE_DIR, ThreadConnections
+
+TRANSCRIPT_CACHE = os.environ.get('TRANSCRIPT_CACHE', '1') == '1'
+TRANSCRIPT_CACHE_PATH = os.environ.get('TRANSCRIPT_CACHE_PATH', os.path.join(CACHE_DIR, "transcripts.sqlite3"))
+TRANSCRIPT_CACHE_TTL = int(os.environ.get('TRANSCRIPT_CACHE_TTL', 7 * 24 * 3600))
+TRANSCRIPT_CACHE_MAX_BYTES = int(os.environ.get('TRANSCRIPT_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+
+# Where a transcript came from; manual captions beat auto-generated ones, which beat Whisper
+SOURCES = ('manual', 'auto', 'whisper')
+# Stored for a transcript without a language, which is part of the key and can't be NULL
+UNKNOWN_LANGUAGE = 'und'
+
+
+def make_transcript(segments, language, source):
+    if not isinstance(segments, SegmentStore):
+        segments = SegmentStore.from_segments(segments)
+    return {'segments': segments, 'language': language, 'source': source}
+
+
+def transcript_text(transcript):
+    return transcript['segments'].text
+
+
+class TranscriptCache:
+    # One row per (video id, language) holding a zlib-compressed SegmentStore. Safe for
+    # concurrent readers and writers across threads and processes through SQLite's WAL mode.
+    def __init__(self, path=TRANSCRIPT_CACHE_PATH, ttl=TRANSCRIPT_CACHE_TTL, max_bytes=TRANSCRIPT_CACHE_MAX_BYTES):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._connections = ThreadConnections(path)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS transcripts ("
+                "video_id TEXT NOT NULL, language TEXT NOT NULL, source TEXT NOT NULL, "
+                "data BLOB NOT NULL, size INTEGER NOT NULL, expires REAL NOT NULL, last_used REAL NOT NULL, "
+                "PRIMARY KEY (video_id, language))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS transcripts_last_used ON transcripts (last_used)")
+
+    def _connect(self):
+        return self._connections.get()
+
+    def get(self, video_id, languages=None):
+        # Preferred languages first, then the best-provenance transcript in any language
+        now = time.time()
+        try:
+            with self._connect() as conn:
+                rows = conn.execute(
+                    "SELECT language, source, data FROM transcripts WHERE video_id = ? AND expires > ?",
+                    (video_id, now),
+                ).fetchall()
+                if not rows:
+                    return None
+                preference = list(languages or [])
+                rows.sort(key=lambda row: (
+                    preference.index(row[0]) if row[0] in preference else len(preference),
+                    SOURCES.index(row[1]) if row[1] in SOURCES else len(SOURCES),
+                ))
+                language, source, data = rows[0]
+                conn.execute(
+                    "UPDATE transcripts SET last_used = ? WHERE video_id = ? AND language = ?",
+                    (now, video_id, language),
+                )
+            return make_transcript(SegmentStore.from_bytes(zlib.decompress(data)), None if language == UNKNOWN_LANGUAGE else language, source)
+        except (sqlite3.Error, zlib.error, struct.error, ValueError):
+            return None
+
+    def put(self, video_id, transcript):
+        data = zlib.compress(transcript['segments'].to_bytes())
+        now = time.time()
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO transcripts "
+                    "(video_id, language, source, data, size, expires, last_used) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (video_id, transcript['language'] or UNKNOWN_LANGUAGE, transcript['source'], data, len(data), now + self.ttl, now),
+                )
+            self.evict()
+        except sqlite3.Error:
+            pass
+
+    def evict(self):
+        # Expired rows go first, then least recently used ones until the disk budget fits
+        with self._connect() as conn:
+            conn.execute("DELETE FROM transcripts WHERE expires <= ?", (time.time(),))
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM transcripts").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            for video_id, language, size in conn.execute(
+                "SELECT video_id, language, size FROM transcripts ORDER BY last_used"
+            ).fetchall():
+                if total <= self.max_bytes:
+                    break
+                conn.execute("DELETE FROM transcripts WHERE video_id = ? AND language = ?", (video_id, language))
+                total -= size
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_transcript_cache():
+    global _cache
+    if not TRANSCRIPT_CACHE:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = TranscriptCache()
+        return _cache
@@ -0,0 +1,143 @@
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import increment, span
+from segmenter import pack_batches
+from translation_memory import get_memory
+
+TRANSLATE_WORKERS = int(os.environ.get('TRANSLATE_WORKERS', 4))
+TRANSLATE_RPS = float(os.environ.get('TRANSLATE_RPS', 1.0))
+TRANSLATE_BURST = int(os.environ.get('TRANSLATE_BURST', 2))
+TRANSLATE_RETRIES = int(os.environ.get('TRANSLATE_RETRIES', 3))
+BACKOFF_BASE_SECONDS = 2.0
+BACKOFF_MAX_SECONDS = 30.0
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+_rate_share = 1
+
+
+class TokenBucket:
+    # Allows `rate` calls per second on average, with bursts of up to `burst`
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def get_limiter(name='default'):
+    # One bucket per backend for the whole process, so concurrent jobs together stay
+    # within TRANSLATE_RPS instead of each getting the full rate
+    with _limiters_lock:
+        if name not in _limiters:
+            _limiters[name] = TokenBucket(TRANSLATE_RPS / _rate_share, max(1, TRANSLATE_BURST // _rate_share))
+        return _limiters[name]
+
+
+def share_rate(processes):
+    # For pools of worker processes: each one gets an equal share of TRANSLATE_RPS
+    global _rate_share
+    with _limiters_lock:
+        _rate_share = max(1, processes)
+        _limiters.clear()
+
+
+def backoff_delay(attempt):
+    delay = min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt)
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def _translate_with_retries(translate, batch, retries):
+    for attempt in range(retries):
+        try:
+            with span('translation_request'):
+                return translate(batch)
+        except Exception:
+            if attempt + 1 < retries:
+                increment('retries', operation='translation')
+                time.sleep(backoff_delay(attempt))
+    return None
+
+
+def _translate_batch(translate, batch, retries):
+    # A batch that fails every retry is halved and each half tried once more, so one bad
+    # chunk only fails itself. Returns one result per text, None where a text failed.
+    translated = _translate_with_retries(translate, batch, retries)
+    if translated is not None:
+        return translated
+    if len(batch) == 1:
+        return [None]
+    increment('batch_splits', operation='translation')
+    middle = len(batch) // 2
+    return _translate_batch(translate, batch[:middle], 1) + _translate_batch(translate, batch[middle:], 1)
+
+
+def iter_translate_batches(batches, translate, workers=TRANSLATE_WORKERS, retries=TRANSLATE_RETRIES):
+    # Yields (index, results) in input order as soon as a batch and every batch before it are
+    # done, while later batches keep translating. `translate` takes a list of texts and does its
+    # own rate limiting, one limiter token per provider request.
+    if not batches:
+        return
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(batches)))) as pool:
+        futures = [pool.submit(_translate_batch, translate, batch, retries) for batch in batches]
+        try:
+            for i, future in enumerate(futures):
+                yield i, future.result()
+        finally:
+            # The consumer stopped early; don't spend rate-limit budget on chunks nobody reads
+            for future in futures:
+                future.cancel()
+
+
+def _count_hits(cached):
+    hits = sum(1 for hit in cached if hit is not None)
+    increment('cache_hits', hits, cache='translation_memory')
+    increment('cache_misses', len(cached) - hits, cache='translation_memory')
+
+
+def iter_translate_batched(chunks, backend, source, target, memory=None):
+    # Chunks already in the translation memory skip the worker pool and the rate limiter; the
+    # misses are packed into as few backend requests as the backend's limits allow. A chunk
+    # that still fails after its batch was retried and split yields None.
+    memory = memory or get_memory()
+    cached = [memory.get(chunk, source, target) if memory else None for chunk in chunks]
+    if memory:
+        _count_hits(cached)
+    missing = [i for i, hit in enumerate(cached) if hit is None]
+    batches = [
+        [missing[j] for j in batch]
+        for batch in pack_batches([chunks[i] for i in missing], backend.max_chars, backend.max_bytes, backend.max_items)
+    ]
+    fresh = iter_translate_batches(
+        [[chunks[i] for i in batch] for batch in batches],
+        lambda texts: backend.translate_batch(texts, source, target),
+    )
+
+    results = {}
+    for i, result in enumerate(cached):
+        if result is None:
+            if i not in results:
+                b, translated = next(fresh)
+                for j, text in zip(batches[b], translated):
+                    results[j] = text
+                    if text is not None and memory:
+                        memory.put(chunks[j], source, target, text)
+            result = results.pop(i)
+        yield i, result
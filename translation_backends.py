@@ -0,0 +1,135 @@
+import importlib
+import logging
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+
+from segmenter import TRANSLATE_MAX_BYTES, TRANSLATE_MAX_CHARS, split_text
+from translation import get_limiter
+
+logger = logging.getLogger(__name__)
+
+# google: the public Google Translate endpoint; local: an offline engine behind
+# TRANSLATION_LOCAL_HOOK; stub: no translation, for tests and benchmarks
+TRANSLATION_BACKEND = os.environ.get('TRANSLATION_BACKEND', 'google')
+# Most texts sent in one request; the size limit is TRANSLATE_MAX_CHARS / TRANSLATE_MAX_BYTES
+TRANSLATION_BATCH_ITEMS = int(os.environ.get('TRANSLATION_BATCH_ITEMS', 50))
+# "module:function" taking (texts, source, target) and returning one translation per text
+TRANSLATION_LOCAL_HOOK = os.environ.get('TRANSLATION_LOCAL_HOOK')
+# The stub waits this long per request, like a round trip to a real provider
+TRANSLATION_STUB_LATENCY = float(os.environ.get('TRANSLATION_STUB_LATENCY', 0))
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+class TranslationBackend(ABC):
+    # translate_batch() takes a list of texts and returns one translation per text, in order,
+    # using as few provider requests as it can. The engine packs texts into batches that fit
+    # max_chars / max_bytes / max_items, so one call is meant to be one request; every request
+    # actually sent takes its own token from the backend's rate limiter.
+    name = None
+    max_chars = TRANSLATE_MAX_CHARS
+    max_bytes = TRANSLATE_MAX_BYTES
+    max_items = TRANSLATION_BATCH_ITEMS
+
+    def _start_request(self):
+        get_limiter(self.name).acquire()
+
+    @abstractmethod
+    def translate_batch(self, texts, source, target):
+        pass
+
+
+class GoogleBackend(TranslationBackend):
+    # One text per line: the endpoint keeps line breaks, so a batch is the texts joined by
+    # newlines and the reply is split on them again. If the reply has a different number of
+    # lines, the batch is halved until each half comes back whole.
+    name = 'google'
+
+    def translate_batch(self, texts, source, target):
+        lines = [" ".join(text.split()) for text in texts]
+        results = [''] * len(lines)
+        filled = [i for i, line in enumerate(lines) if line]
+        for i, translated in zip(filled, self._translate_lines([lines[i] for i in filled], source, target)):
+            results[i] = translated
+        return results
+
+    def _translate_lines(self, lines, source, target):
+        if not lines:
+            return []
+        if len(lines) == 1:
+            return [self._translate_one(lines[0], source, target)]
+
+        reply = self._request("\n".join(lines), source, target)
+        translated = [line.strip() for line in reply.split("\n") if line.strip()]
+        if len(translated) == len(lines):
+            return translated
+        logger.debug("Batch of %d lines came back as %d, splitting it", len(lines), len(translated))
+        middle = len(lines) // 2
+        return self._translate_lines(lines[:middle], source, target) + self._translate_lines(lines[middle:], source, target)
+
+    def _translate_one(self, text, source, target):
+        # A single caption segment can exceed the provider limit on its own
+        if len(text) > self.max_chars:
+            return " ".join(self._request(piece, source, target) for piece in split_text(text, self.max_chars))
+        return self._request(text, source, target)
+
+    def _request(self, text, source, target):
+        from google_translate import google_translate
+
+        self._start_request()
+        return google_translate(text, source, target)
+
+
+class LocalBackend(TranslationBackend):
+    # Array in, array out: the hook gets the whole batch and returns a list of the same length
+    name = 'local'
+
+    def __init__(self, hook=None):
+        hook = hook or TRANSLATION_LOCAL_HOOK
+        if not hook:
+            raise ValueError("TRANSLATION_LOCAL_HOOK is not set (expected module:function)")
+        module, _, function = hook.partition(':')
+        self.hook = getattr(importlib.import_module(module), function)
+
+    def translate_batch(self, texts, source, target):
+        self._start_request()
+        results = list(self.hook(list(texts), source, target))
+        if len(results) != len(texts):
+            raise ValueError(f"Local translation hook returned {len(results)} results for {len(texts)} texts")
+        return results
+
+
+class StubBackend(TranslationBackend):
+    # Deterministic output: "[target] text" for every text, after `latency` seconds per request
+    name = 'stub'
+
+    def __init__(self, latency=None):
+        self.latency = TRANSLATION_STUB_LATENCY if latency is None else latency
+
+    def translate_batch(self, texts, source, target):
+        self._start_request()
+        if self.latency:
+            time.sleep(self.latency)
+        return [f"[{target}] {text}" for text in texts]
+
+
+def load_translation_backend(name=None):
+    name = name or TRANSLATION_BACKEND
+    if name == 'google':
+        return GoogleBackend()
+    if name == 'local':
+        return LocalBackend()
+    if name == 'stub':
+        return StubBackend()
+    raise ValueError(f"Unknown TRANSLATION_BACKEND {name!r}")
+
+
+def get_translation_backend(name=None):
+    name = name or TRANSLATION_BACKEND
+    with _backends_lock:
+        if name not in _backends:
+            _backends[name] = load_translation_backend(name)
+        return _backends[name]
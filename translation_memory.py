@@ -0,0 +1,109 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+
+from metrics import increment
+from sqlite_db import CACHE_DIR, ThreadConnections
+
+TRANSLATION_MEMORY = os.environ.get('TRANSLATION_MEMORY', '1') == '1'
+TRANSLATION_MEMORY_PATH = os.environ.get('TRANSLATION_MEMORY_PATH', os.path.join(CACHE_DIR, "translation_memory.sqlite3"))
+TRANSLATION_MEMORY_MAX_BYTES = int(os.environ.get('TRANSLATION_MEMORY_MAX_BYTES', 256 * 1024 * 1024))
+# Checking the total size on every write would cost a table scan each time
+EVICTION_CHECK_EVERY = 100
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_segment(text):
+    return _WHITESPACE.sub(' ', unicodedata.normalize('NFC', text)).strip()
+
+
+def segment_key(text, source, target):
+    data = '\0'.join([normalize_segment(text), source or '', target])
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+
+class TranslationMemory:
+    # Content-addressed store of finished translations, shared by every session and process
+    # on this host. Least recently used entries are evicted once `max_bytes` is exceeded.
+    def __init__(self, path=TRANSLATION_MEMORY_PATH, max_bytes=TRANSLATION_MEMORY_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._connections = ThreadConnections(path)
+        self._lock = threading.Lock()
+        self._writes = 0
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS memory ("
+                "key TEXT PRIMARY KEY, translation TEXT NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS memory_last_used ON memory (last_used)")
+
+    def _connect(self):
+        return self._connections.get()
+
+    def get(self, text, source, target):
+        key = segment_key(text, source, target)
+        try:
+            with self._connect() as conn:
+                row = conn.execute("SELECT translation FROM memory WHERE key = ?", (key,)).fetchone()
+                if row:
+                    conn.execute("UPDATE memory SET last_used = ? WHERE key = ?", (time.time(), key))
+        except sqlite3.Error:
+            increment('cache_errors', cache='translation_memory')
+            return None
+        return row[0] if row else None
+
+    def put(self, text, source, target, translation):
+        key = segment_key(text, source, target)
+        size = len(key) + len(translation.encode('utf-8'))
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO memory (key, translation, size, last_used) VALUES (?, ?, ?, ?)",
+                    (key, translation, size, time.time()),
+                )
+        except sqlite3.Error:
+            increment('cache_errors', cache='translation_memory')
+            return
+        with self._lock:
+            self._writes += 1
+            check = self._writes % EVICTION_CHECK_EVERY == 1
+        if check:
+            self.evict()
+
+    def evict(self):
+        # Trim to 90% of the budget so the next few writes don't trigger another pass
+        with self._connect() as conn:
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM memory").fetchone()[0]
+            if total <= self.max_bytes:
+                return 0
+            excess = total - int(self.max_bytes * 0.9)
+            removed = 0
+            freed = 0
+            for key, size in conn.execute("SELECT key, size FROM memory ORDER BY last_used").fetchall():
+                if freed >= excess:
+                    break
+                conn.execute("DELETE FROM memory WHERE key = ?", (key,))
+                freed += size
+                removed += 1
+        increment('cache_evictions', removed, cache='translation_memory')
+        return removed
+
+
+_memory = None
+_memory_lock = threading.Lock()
+
+
+def get_memory():
+    global _memory
+    if not TRANSLATION_MEMORY:
+        return None
+    with _memory_lock:
+        if _memory is None:
+            _memory = TranslationMemory()
+        return _memory
@@ -0,0 +1,217 @@
+import os
+import time
+
+import streamlit as st
+
+from jobs import QUEUED, RUNNING, DONE, get_job_queue
+from metrics import latencies
+from playlists import list_collection
+
+JOB_POLL_SECONDS = float(os.environ.get('JOB_POLL_SECONDS', 1.0))
+# Videos of one playlist or channel queued or running at a time; the next ones are submitted as
+# these finish, so other sessions' jobs don't wait behind the whole collection
+COLLECTION_WINDOW = int(os.environ.get('COLLECTION_WINDOW', 2))
+
+# Spans shown in the sidebar, in pipeline order
+LATENCY_LABELS = {
+    'metadata': "Metadata",
+    'transcript': "Transcript",
+    'captions': "Captions",
+    'audio_download': "Audio download",
+    'asr': "Transcription",
+    'detection': "Language detection",
+    'translation_request': "Translation request",
+    'translation': "Translation",
+}
+
+
+def start_job(url, target_lang, attempts):
+    # The pipeline runs on a job worker; the page only keeps the job id. A run that failed
+    # earlier for the same video and language resumes at its failed stage.
+    # A click while the same video and language is still processing keeps the running job
+    job = current_job()
+    if job is not None and job_pending(job) and (job['video_url'], job['target_lang']) == (url, target_lang):
+        return job['id']
+    job_id = get_job_queue().submit(url, target_lang, attempts)
+    forget_collection()
+    st.session_state['job_id'] = job_id
+    st.query_params['job'] = job_id
+    return job_id
+
+
+def start_collection(url, target_lang, attempts):
+    # One job per video, submitted COLLECTION_WINDOW at a time as the page polls
+    collection = current_collection()
+    if collection is not None and (collection['url'], collection['target_lang']) == (url, target_lang) \
+            and collection_pending(collection):
+        return collection
+    try:
+        listing = list_collection(url)
+    except Exception as e:
+        st.error(f"Could not list the playlist or channel: {str(e)}")
+        return None
+    if not listing['entries']:
+        st.info("No videos found in this playlist or channel.")
+        return None
+
+    collection = dict(
+        listing,
+        url=url,
+        target_lang=target_lang,
+        attempts=attempts,
+        job_ids=[None] * len(listing['entries']),  # None until the video is submitted
+        finished={},  # entry index -> finished job, None if it expired
+        started_at=time.time(),
+    )
+    forget_job()
+    st.session_state['collection'] = collection
+    _refresh_collection(collection)
+    return collection
+
+
+def _refresh_collection(collection):
+    # One job per entry, None where the video isn't submitted yet or its job expired. Finished
+    # jobs are kept in the session and not polled again; as in-flight ones finish, the next
+    # videos are submitted to keep COLLECTION_WINDOW of them in the queue.
+    queue = get_job_queue()
+    job_ids, finished = collection['job_ids'], collection['finished']
+    jobs = [None] * len(job_ids)
+    in_flight = 0
+    for i, job_id in enumerate(job_ids):
+        if i in finished:
+            jobs[i] = finished[i]
+        elif job_id is not None:
+            jobs[i] = queue.poll(job_id)
+            if jobs[i] is None or not job_pending(jobs[i]):
+                finished[i] = jobs[i]
+            else:
+                in_flight += 1
+    for i, entry in enumerate(collection['entries']):
+        if in_flight >= COLLECTION_WINDOW:
+            break
+        if job_ids[i] is None:
+            job_ids[i] = queue.submit(entry['url'], collection['target_lang'], collection['attempts'])
+            jobs[i] = queue.poll(job_ids[i])
+            in_flight += 1
+    return jobs
+
+
+def current_collection():
+    return st.session_state.get('collection')
+
+
+def forget_collection():
+    st.session_state.pop('collection', None)
+
+
+def collection_pending(collection):
+    _refresh_collection(collection)
+    return len(collection['finished']) < len(collection['entries'])
+
+
+def show_collection_progress(collection):
+    # Overall progress and throughput, then one line per video. Returns True while any video
+    # is still queued or running.
+    jobs = _refresh_collection(collection)
+    total = len(jobs)
+    finished = [job for job in collection['finished'].values() if job is not None]
+    pending = len(collection['finished']) < total
+    ended = time.time() if pending or not finished else max(job['finished_at'] for job in finished)
+    elapsed = max(ended - collection['started_at'], 1e-3)
+    video_seconds = sum(
+        entry['duration'] or 0
+        for entry, job in zip(collection['entries'], jobs) if job is not None and job['status'] == DONE
+    )
+
+    st.subheader(collection['title'])
+    if collection['duplicates']:
+        st.caption(f"{collection['duplicates']} duplicate entries skipped")
+    st.progress(len(finished) / total, text=f"{len(finished)} of {total} videos finished")
+    columns = st.columns(3)
+    columns[0].metric("Videos finished", f"{len(finished)}/{total}")
+    columns[1].metric("Throughput", f"{len(finished) / elapsed * 60:.1f} videos/min")
+    columns[2].metric("Speed", f"{video_seconds / elapsed:.1f}x real time" if video_seconds else "-")
+
+    for entry, job_id, job in zip(collection['entries'], collection['job_ids'], jobs):
+        if job_id is None:
+            st.progress(0.0, text=f"{entry['title']}: waiting")
+        elif job is None:
+            st.caption(f"{entry['title']}: expired")
+        elif job_pending(job):
+            if job['total_chunks']:
+                st.progress(job['done_chunks'] / job['total_chunks'],
+                            text=f"{entry['title']}: translated {job['done_chunks']} of {job['total_chunks']} chunks")
+            else:
+                st.progress(0.0, text=f"{entry['title']}: {'waiting' if job['status'] == QUEUED else 'fetching transcript'}")
+        else:
+            outcome = job['outcome']
+            with st.expander(f"{'✅' if job['status'] == DONE and 'message' not in outcome else '❌'} {entry['title']}"):
+                if 'message' in outcome:
+                    st.info(outcome['message'])
+                else:
+                    st.text(outcome['translated'])
+                    st.download_button("Download translation", outcome['translated'], key=f"download-{job['id']}",
+                                       file_name=f"{entry['id']}.{collection['target_lang']}.txt", mime="text/plain")
+    return pending
+
+
+def current_job():
+    # session_state survives reruns; the query parameter survives a page reload
+    job_id = st.session_state.get('job_id') or st.query_params.get('job')
+    if not job_id:
+        return None
+    job = get_job_queue().poll(job_id)
+    if job is None:
+        forget_job()
+    else:
+        st.session_state['job_id'] = job_id
+    return job
+
+
+def forget_job():
+    st.session_state.pop('job_id', None)
+    if 'job' in st.query_params:
+        del st.query_params['job']
+
+
+def job_pending(job):
+    return job['status'] in (QUEUED, RUNNING)
+
+
+def show_job_progress(job):
+    # Progress bar by chunks done out of chunks total, then the chunks translated so far
+    if job['total_chunks']:
+        done, total = job['done_chunks'], job['total_chunks']
+        st.progress(done / total, text=f"Translated {done} of {total} chunks")
+    elif job['status'] == QUEUED:
+        st.progress(0.0, text="Waiting for a free worker...")
+    else:
+        st.progress(0.0, text="Fetching transcript...")
+    if job['chunks']:
+        st.text("\n\n".join(job['chunks']))
+
+
+def poll_job():
+    # Ends this script run and starts the next one, so the script thread is never held by the job
+    time.sleep(JOB_POLL_SECONDS)
+    st.rerun()
+
+
+def show_latencies():
+    # p50/p95 over the most recent runs in this server process
+    stats = latencies()
+    rows = [
+        f"- **{label}:** {stats[name]['p50']:.2f}s / {stats[name]['p95']:.2f}s ({stats[name]['count']})"
+        for name, label in LATENCY_LABELS.items() if name in stats
+    ]
+    if rows:
+        st.caption("p50 / p95 (runs)")
+        st.markdown("\n".join(rows))
+    else:
+        st.caption("No videos processed yet.")
+
+
+def time_to_first_output(job):
+    if job['first_output_at'] is None:
+        return None
+    return job['first_output_at'] - job['submitted_at']
@@ -0,0 +1,132 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from yt_dlp import YoutubeDL
+
+from metrics import increment, span
+
+# How long an extracted info dict is reused before yt-dlp is asked again
+INFO_TTL_SECONDS = int(os.environ.get('VIDEO_INFO_TTL', 600))
+# Lowest audio bitrate (kbps) worth transcribing; speech is intact well below music bitrates
+ASR_MIN_ABR = float(os.environ.get('ASR_MIN_ABR', 48))
+
+YDL_OPTS = {
+    'format': 'bestaudio/best',
+    'quiet': True,
+    'skip_download': True,
+    'socket_timeout': 30,
+    'nocheckcertificate': True,
+    'ignoreerrors': False,
+    'no_warnings': True,
+    'geo_bypass': True,
+    'http_headers': {
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+        'Accept-Language': 'en-US,en;q=0.9',
+        'Referer': 'https://www.youtube.com/',
+    }
+}
+
+_cache = {}
+_cache_lock = threading.Lock()
+_video_locks = {}  # key -> [lock, callers using it]
+
+
+@contextmanager
+def _video_lock(key):
+    # Shared by every caller waiting on the same video; dropped once the last one is done
+    with _cache_lock:
+        entry = _video_locks.setdefault(key, [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        with entry[0]:
+            yield
+    finally:
+        with _cache_lock:
+            entry[1] -= 1
+            if not entry[1]:
+                del _video_locks[key]
+
+
+def _cached(key):
+    with _cache_lock:
+        entry = _cache.get(key)
+        if entry and entry[0] > time.monotonic():
+            return entry[1]
+    return None
+
+
+def _store(key, info):
+    now = time.monotonic()
+    with _cache_lock:
+        for stale in [k for k, (expires, _) in _cache.items() if expires <= now]:
+            del _cache[stale]
+        _cache[key] = (now + INFO_TTL_SECONDS, info)
+
+
+def get_video_info(video_url, video_id=None):
+    # One yt-dlp round trip per video id; concurrent callers wait for it
+    key = video_id or video_url
+    info = _cached(key)
+    if info is not None:
+        increment('cache_hits', cache='video_info')
+        return info
+
+    with _video_lock(key):
+        info = _cached(key)
+        if info is not None:
+            increment('cache_hits', cache='video_info')
+            return info
+
+        increment('cache_misses', cache='video_info')
+        with span('metadata'), YoutubeDL(YDL_OPTS) as ydl:
+            info = ydl.extract_info(video_url, download=False)
+
+        if info is not None:
+            _store(key, info)
+        return info
+
+
+def invalidate(video_id):
+    with _cache_lock:
+        _cache.pop(video_id, None)
+
+
+# Caption formats captions.py can parse, easiest first
+CAPTION_FORMATS = ('json3', 'srv3', 'srv1', 'vtt')
+
+
+def caption_track(info, lang='en'):
+    # Returns (track, source): manual subtitles beat auto-generated ones
+    for source, key in (('manual', 'subtitles'), ('auto', 'automatic_captions')):
+        tracks = [t for t in (info.get(key) or {}).get(lang) or [] if t.get('url')]
+        if tracks:
+            tracks.sort(key=lambda t: CAPTION_FORMATS.index(t['ext']) if t.get('ext') in CAPTION_FORMATS else len(CAPTION_FORMATS))
+            return tracks[0], source
+    return None, None
+
+
+def _bitrate(fmt):
+    return fmt.get('abr') or fmt.get('tbr') or 0
+
+
+def audio_format(info, min_abr=None):
+    # For transcription, not playback: Whisper downmixes everything to 16 kHz mono, so take
+    # the smallest audio-only stream of at least min_abr kbps instead of the best one.
+    # HLS/DASH manifests are skipped; the downloader fetches plain byte ranges.
+    min_abr = ASR_MIN_ABR if min_abr is None else min_abr
+    formats = [
+        f for f in info.get('formats') or []
+        if f.get('url') and f.get('protocol', 'https') in ('http', 'https')
+    ]
+    audio_only = [f for f in formats if f.get('vcodec') == 'none' and f.get('acodec') not in (None, 'none')]
+    good_enough = [f for f in audio_only if _bitrate(f) >= min_abr]
+    if good_enough:
+        return min(good_enough, key=_bitrate)
+    if audio_only:
+        return max(audio_only, key=_bitrate)  # nothing reaches the floor, so get as close as possible
+    with_audio = [f for f in formats if f.get('acodec') not in (None, 'none')]
+    if with_audio:
+        return min(with_audio, key=_bitrate)  # muxed streams only; the video track is wasted bytes
+    return {'url': info['url']} if info.get('url') else None
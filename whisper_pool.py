@@ -0,0 +1,92 @@
+import logging
+import os
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+WHISPER_MODEL = os.environ.get('WHISPER_MODEL', 'base')
+WHISPER_POOL_SIZE = int(os.environ.get('WHISPER_POOL_SIZE', 1))
+WHISPER_WARMUP = os.environ.get('WHISPER_WARMUP', '1') == '1'
+
+_pools = {}
+_pools_lock = threading.Lock()
+_warm_up_started = False
+
+
+class ModelPool:
+    # Hands out at most `size` instances of one model from the configured ASR backend; callers
+    # block when all are busy, because whisper's decoder installs hooks on the model and is not
+    # safe to share.
+    def __init__(self, name, size):
+        self.name = name
+        self.size = size
+        self._idle = []
+        self._created = 0
+        self._changed = threading.Condition()
+
+    def acquire(self):
+        # Waiters wake on every release and on every failed load, so when a load fails the
+        # next waiter tries it again instead of waiting for a model that will never arrive
+        with self._changed:
+            while not self._idle and self._created >= self.size:
+                self._changed.wait()
+            if self._idle:
+                return self._idle.pop()
+            self._created += 1
+
+        try:
+            from asr_backends import load_asr_model  # pulls in the audio and HTTP stack
+
+            return load_asr_model(self.name)
+        except BaseException:
+            with self._changed:
+                self._created -= 1
+                self._changed.notify()
+            raise
+
+    def release(self, model):
+        with self._changed:
+            self._idle.append(model)
+            self._changed.notify()
+
+
+def get_pool(name=None):
+    name = name or WHISPER_MODEL
+    with _pools_lock:
+        if name not in _pools:
+            _pools[name] = ModelPool(name, WHISPER_POOL_SIZE)
+        return _pools[name]
+
+
+@contextmanager
+def whisper_model(name=None):
+    pool = get_pool(name)
+    model = pool.acquire()
+    try:
+        yield model
+    finally:
+        pool.release(model)
+
+
+def warm_up(name=None):
+    try:
+        import numpy as np
+
+        with whisper_model(name) as model:
+            # One second of silence runs the whole decode path once
+            model.transcribe(np.zeros(16000, dtype=np.float32), fp16=False)
+    except ImportError:
+        logger.info("Whisper not installed, skipping warm-up")
+    except Exception:
+        logger.exception("Whisper warm-up failed")
+
+
+def start_warm_up(name=None):
+    # Safe to call on every Streamlit rerun; only the first call starts the thread
+    global _warm_up_started
+    with _pools_lock:
+        if _warm_up_started or not WHISPER_WARMUP:
+            return
+        _warm_up_started = True
+    threading.Thread(target=warm_up, args=(name,), name="whisper-warm-up", daemon=True).start()